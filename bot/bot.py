@@ -8,9 +8,22 @@ from aiogram.fsm.storage.memory import MemoryStorage
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler_di.decorator import ContextSchedulerDecorator
 
 from resources.states import States
+from resources.expense_attributes import ExpenseAttribute
+from resources.currency_rate_extractor import CurrencyRateExtractor
+from resources.reference_data import ReferenceData
+from resources.scheduler_job_templates import (
+    job_prefetch_currency_rates,
+    job_repair_zero_rated_expenses,
+    job_evict_stale_fsm_states
+)
+from database.database import DatabaseFacade
+from database.fsm_storage import FsmDataCodec, PostgresStorage
+from middlewares import DatabaseSessionMiddleware, FsmBatchMiddleware
 from handlers import (
     BasicHandlersRouterBuilder,
     SetupHandlersRouterBuilder,
@@ -24,8 +37,16 @@ from logger import Logger
 class BotRunner:
     def __init__(self, bot_token: str):
         self.bot = Bot(token=bot_token)
-        self.dispatcher = Dispatcher(storage=MemoryStorage())
         self.logger = Logger()
+        # memory storage is a local stand-in, flows are lost on restart and can not be shared between processes
+        match os.getenv("FSM_STORAGE", "postgres"):
+            case "memory":
+                self.dispatcher = Dispatcher(storage=MemoryStorage())
+            case _:
+                storage = PostgresStorage(DatabaseFacade(), FsmDataCodec(self.bot, [ExpenseAttribute]))
+                self.dispatcher = Dispatcher(storage=storage)
+                FsmBatchMiddleware.setup(self.dispatcher, storage)
+        self.dispatcher.update.middleware(DatabaseSessionMiddleware(DatabaseFacade(), self.logger))
         self.states = States
         self.scheduler = ContextSchedulerDecorator(
             AsyncIOScheduler(jobstores={
@@ -36,6 +57,32 @@ class BotRunner:
         )
         self.scheduler.ctx.add_instance(self.bot, Bot)
         self.scheduler.start()
+        self.add_system_jobs()
+
+    def add_system_jobs(self):
+        # exchange-api publishes rates of the new day shortly after 00:00 UTC
+        self.scheduler.add_job(job_prefetch_currency_rates,
+                               CronTrigger.from_crontab(os.getenv("CURRENCY_RATES_PREFETCH_CRON", "30 0 * * *"),
+                                                        timezone="UTC"),
+                               id="system_prefetch_currency_rates",
+                               replace_existing=True,
+                               kwargs={
+                                   "logger": self.logger
+                               })
+        self.scheduler.add_job(job_repair_zero_rated_expenses,
+                               IntervalTrigger(minutes=int(os.getenv("CURRENCY_RATES_REPAIR_INTERVAL", 15))),
+                               id="system_repair_zero_rated_expenses",
+                               replace_existing=True,
+                               kwargs={
+                                   "logger": self.logger
+                               })
+        self.scheduler.add_job(job_evict_stale_fsm_states,
+                               IntervalTrigger(hours=1),
+                               id="system_evict_stale_fsm_states",
+                               replace_existing=True,
+                               kwargs={
+                                   "logger": self.logger
+                               })
 
     def register_handlers(self):
         basic_router = BasicHandlersRouterBuilder(self.logger)
@@ -56,6 +103,7 @@ class BotRunner:
         self.dispatcher.include_routers(*[basic_router, expense_router, setup_router, schedule_router, ai_router])
 
     async def on_startup(self, *args):
+        await ReferenceData.get_shared().load()
         await self.bot.set_my_commands(
             [
                 BotCommand(command='add', description='add expense'),
@@ -72,3 +120,5 @@ class BotRunner:
 
     async def shutdown(self, *args):
         await self.dispatcher.storage.close()
+        await CurrencyRateExtractor.close()
+        await DatabaseFacade.get_async_engine().dispose()
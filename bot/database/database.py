@@ -1,12 +1,26 @@
 import os
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 from functools import lru_cache
+from typing import AsyncIterator, Iterator
 
-from sqlalchemy import create_engine, MetaData
-from sqlalchemy.engine import Engine
+from sqlalchemy import create_engine, event, MetaData
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
 Base = declarative_base(metadata=MetaData(schema="expense_bot"))
 
+_scoped_session: ContextVar[AsyncSession | None] = ContextVar("scoped_session", default=None)
+_statement_counter: ContextVar[dict[str, int] | None] = ContextVar("statement_counter", default=None)
+
+
+def _count_statement(conn, cursor, statement: str, parameters, context, executemany):
+    counter = _statement_counter.get()
+    if counter is not None:
+        counter["statements"] += 1
+        counter["writes"] += not statement.lstrip().upper().startswith("SELECT")
+
 
 class DatabaseFacade:
     @staticmethod
@@ -17,7 +31,92 @@ class DatabaseFacade:
         return create_engine(os.environ["EXPENSE_BOT_DB_CONNECTION_STRING"])
 
     @staticmethod
-    @lru_cache
     def get_session(connection_string: str = "") -> Session:
-        session_type = sessionmaker(DatabaseFacade.get_engine(connection_string), future=True)
-        return session_type()
+        return sessionmaker(DatabaseFacade.get_engine(connection_string), future=True)()
+
+    @staticmethod
+    def get_async_engine(connection_string: str = "") -> AsyncEngine:
+        """
+        Pooled asyncpg engine, driver is forced regardless of the one in connection string.
+        One engine per database: calls with and without the default connection string share it.
+        """
+        return DatabaseFacade.__create_async_engine(
+            connection_string or os.environ["EXPENSE_BOT_DB_CONNECTION_STRING"]
+        )
+
+    @staticmethod
+    @lru_cache
+    def __create_async_engine(connection_string: str) -> AsyncEngine:
+        url = make_url(connection_string)
+        engine = create_async_engine(
+            url.set(drivername="postgresql+asyncpg"),
+            pool_size=int(os.getenv("EXPENSE_BOT_DB_POOL_SIZE", 5)),
+            max_overflow=int(os.getenv("EXPENSE_BOT_DB_MAX_OVERFLOW", 10)),
+            pool_pre_ping=True
+        )
+        event.listen(engine.sync_engine, "before_cursor_execute", _count_statement)
+        return engine
+
+    @staticmethod
+    @lru_cache
+    def get_async_session_maker(connection_string: str = "") -> async_sessionmaker[AsyncSession]:
+        return async_sessionmaker(DatabaseFacade.get_async_engine(connection_string), expire_on_commit=False)
+
+    @staticmethod
+    @asynccontextmanager
+    async def session_scope(connection_string: str = "") -> AsyncIterator[AsyncSession]:
+        """
+        Opens a short-lived session for one unit of work (Telegram update or scheduler job).
+        Every `get_async_session` call inside the scope reuses it instead of opening a new one.
+        """
+        async with DatabaseFacade.get_async_session_maker(connection_string)() as session:
+            token = _scoped_session.set(session)
+            try:
+                yield session
+            finally:
+                _scoped_session.reset(token)
+
+    @staticmethod
+    @asynccontextmanager
+    async def get_async_session(connection_string: str = "") -> AsyncIterator[AsyncSession]:
+        """
+        Session of the current scope if there is one, otherwise a new session closed on exit.
+        A scoped session is closed when the outermost block using it exits: uncommitted work is discarded
+        and the connection goes back to the pool instead of idling in transaction during Telegram calls.
+        """
+        session = _scoped_session.get()
+        if session is None:
+            async with DatabaseFacade.get_async_session_maker(connection_string)() as session:
+                yield session
+            return
+        session.info["depth"] = session.info.get("depth", 0) + 1
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            session.info["depth"] -= 1
+            if not session.info["depth"]:
+                await session.close()
+
+    @staticmethod
+    @contextmanager
+    def count_statements() -> Iterator[dict[str, int]]:
+        """Counts statements (and non-SELECT ones among them) executed by async engines within the block."""
+        counter = {"statements": 0, "writes": 0}
+        token = _statement_counter.set(counter)
+        try:
+            yield counter
+        finally:
+            _statement_counter.reset(token)
+
+    @staticmethod
+    def get_pool_stats(connection_string: str = "") -> dict[str, int]:
+        pool = DatabaseFacade.get_async_engine(connection_string).pool
+        return {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        }
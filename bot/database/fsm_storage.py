@@ -0,0 +1,192 @@
+import copy
+import json
+import os
+import zlib
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime as dt, timedelta as td
+from enum import Enum
+from typing import Any, AsyncIterator, Dict, Optional
+
+from aiogram import Bot, types
+from aiogram.types.base import TelegramObject
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.database import DatabaseFacade
+from database.models import FsmStates
+
+_cached_entries: ContextVar[dict[str, dict] | None] = ContextVar("fsm_cached_entries", default=None)
+_batch_storage: ContextVar[Optional["PostgresStorage"]] = ContextVar("fsm_batch_storage", default=None)
+
+
+async def flush_fsm_batch() -> None:
+    """Writes FSM changes of the current update now, call it before long awaits. No-op outside `batch()`."""
+    storage = _batch_storage.get()
+    if storage is not None:
+        await storage.flush()
+
+
+class FsmDataCodec:
+    """
+    Compact JSON of FSM data, zlib-compressed when it is longer than `compress_from` bytes.
+    Telegram objects and registered enums kept in data are tagged, so they are restored as they were stored.
+    """
+    RAW, COMPRESSED = b"j", b"z"
+
+    def __init__(self, bot: Bot, enums: list[type[Enum]], compress_from: int = 512):
+        self.bot = bot
+        self.enums = {enum.__name__: enum for enum in enums}
+        self.compress_from = compress_from
+
+    def encode(self, data: Dict[str, Any]) -> bytes:
+        raw = json.dumps(data, default=self.__tag, separators=(",", ":"), ensure_ascii=False).encode()
+        if len(raw) > self.compress_from:
+            return self.COMPRESSED + zlib.compress(raw)
+        return self.RAW + raw
+
+    def decode(self, blob: bytes) -> Dict[str, Any]:
+        raw = zlib.decompress(blob[1:]) if blob[:1] == self.COMPRESSED else blob[1:]
+        return json.loads(raw, object_hook=self.__untag)
+
+    def __tag(self, value: Any) -> dict:
+        if isinstance(value, TelegramObject):
+            return {"__tg__": type(value).__name__, "v": value.model_dump(mode="json", exclude_none=True)}
+        if isinstance(value, Enum) and type(value).__name__ in self.enums:
+            return {"__enum__": type(value).__name__, "v": value.value}
+        raise TypeError(f"{type(value).__name__} can not be kept in FSM data")
+
+    def __untag(self, value: dict) -> Any:
+        if "__tg__" in value:
+            return getattr(types, value["__tg__"]).model_validate(value["v"], context={"bot": self.bot})
+        if "__enum__" in value:
+            return self.enums[value["__enum__"]](value["v"])
+        return value
+
+
+class PostgresStorage(BaseStorage):
+    """
+    FSM storage in `fsm_states` table, so flows survive restarts and can be shared by several bot processes.
+    Inside `batch()` (one per update, see `FsmBatchMiddleware`) states and data are read once per key
+    and changes are written once, when the batch exits, even if the handler fails.
+    Updates handled concurrently read the stored state until then, so handlers flush changes
+    before long awaits (see `flush_fsm_batch`). Outside a batch changes are written right away.
+    Flows untouched for `ttl` seconds are treated as abandoned: they are not returned and `evict_stale()` deletes them.
+    """
+
+    def __init__(self,
+                 db: DatabaseFacade,
+                 codec: FsmDataCodec,
+                 ttl: int = int(os.getenv("FSM_STATE_TTL", 86400))):
+        self.db = db
+        self.codec = codec
+        self.ttl = ttl
+
+    @staticmethod
+    def build_key(key: StorageKey) -> str:
+        return ":".join(str(part) for part in (key.bot_id, key.chat_id, key.user_id, key.thread_id or "", key.destiny))
+
+    @asynccontextmanager
+    async def batch(self) -> AsyncIterator[None]:
+        entries_token = _cached_entries.set({})
+        storage_token = _batch_storage.set(self)
+        try:
+            yield
+        finally:
+            try:
+                await self.flush()
+            finally:
+                _batch_storage.reset(storage_token)
+                _cached_entries.reset(entries_token)
+
+    async def flush(self) -> None:
+        """Writes changed entries of the current batch in one transaction."""
+        cached = _cached_entries.get()
+        if not cached:
+            return
+        dirty = {db_key: entry for db_key, entry in cached.items() if entry.pop("dirty", False)}
+        if not dirty:
+            return
+        async with self.db.get_async_session_maker()() as db:
+            for db_key, entry in dirty.items():
+                await self.__write_entry(db, db_key, entry)
+            await db.commit()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = await self.__get_entry(key)
+        entry["state"] = state.state if isinstance(state, State) else state
+        await self.__save_entry(key, entry)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self.__get_entry(key))["state"]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        entry = await self.__get_entry(key)
+        entry["data"] = copy.deepcopy(data)
+        await self.__save_entry(key, entry)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return copy.deepcopy((await self.__get_entry(key))["data"])
+
+    async def close(self) -> None:
+        pass
+
+    @staticmethod
+    async def evict_stale(db: DatabaseFacade, ttl: int = int(os.getenv("FSM_STATE_TTL", 86400))) -> int:
+        async with db.get_async_session_maker()() as session:
+            result = await session.execute(
+                delete(FsmStates).filter(FsmStates.updated_at < dt.utcnow() - td(seconds=ttl))
+            )
+            await session.commit()
+        return result.rowcount
+
+    async def __get_entry(self, key: StorageKey) -> dict:
+        cached = _cached_entries.get()
+        db_key = self.build_key(key)
+        if cached is not None and db_key in cached:
+            return cached[db_key]
+
+        # own session, storage must never commit or roll back the unit of work of the handler
+        async with self.db.get_async_session_maker()() as db:
+            stored = (await db.execute(
+                select(FsmStates.state, FsmStates.data).filter(
+                    FsmStates.key == db_key,
+                    FsmStates.updated_at >= dt.utcnow() - td(seconds=self.ttl)
+                )
+            )).first()
+        entry = {"state": stored.state, "data": self.codec.decode(stored.data)} if stored \
+            else {"state": None, "data": {}}
+        if cached is not None:
+            cached[db_key] = entry
+        return entry
+
+    async def __save_entry(self, key: StorageKey, entry: dict):
+        if _cached_entries.get() is not None:
+            entry["dirty"] = True
+            return
+        async with self.db.get_async_session_maker()() as db:
+            await self.__write_entry(db, self.build_key(key), entry)
+            await db.commit()
+
+    async def __write_entry(self, db: AsyncSession, db_key: str, entry: dict):
+        if entry["state"] or entry["data"]:
+            statement = insert(FsmStates).values(
+                key=db_key,
+                state=entry["state"],
+                data=self.codec.encode(entry["data"]),
+                updated_at=dt.utcnow()
+            )
+            await db.execute(statement.on_conflict_do_update(
+                index_elements=["key"],
+                set_={
+                    "state": statement.excluded.state,
+                    "data": statement.excluded.data,
+                    "updated_at": statement.excluded.updated_at
+                }
+            ))
+        else:
+            # cleared flows are deleted, not stored as empty rows
+            await db.execute(delete(FsmStates).filter(FsmStates.key == db_key))
@@ -0,0 +1,60 @@
+"""
+Checks that expense lookup queries are planned over the indexes created for them.
+
+Usage (from the bot directory): python -m database.index_usage_check [user_id]
+"""
+import asyncio
+import json
+import os
+import sys
+
+from sqlalchemy import text
+
+from database.database import DatabaseFacade
+from resources.analytics_sql_templates import DEFAULT_WEEKLY_REPORT
+
+CHECKED_QUERIES = {
+    "ix_expenses_user_id_message_id": """
+        SELECT id FROM expense_bot.expenses
+        WHERE user_id = {{user_id}} AND message_id = 0
+    """,
+    "ix_expenses_user_id_spent_on": """
+        SELECT spent_on, amount_in_base_currency FROM expense_bot.expenses
+        WHERE user_id = {{user_id}} AND spent_on BETWEEN CURRENT_DATE - 28 AND CURRENT_DATE
+    """,
+    "pk_weekly_category_totals": DEFAULT_WEEKLY_REPORT,
+}
+
+
+def get_used_indexes(plan: dict) -> set[str]:
+    indexes = {plan["Index Name"]} if "Index Name" in plan else set()
+    for sub_plan in plan.get("Plans", []):
+        indexes |= get_used_indexes(sub_plan)
+    return indexes
+
+
+async def main(user_id: int, pivot_currency: str = os.getenv("CURRENCY_RATES_PIVOT", "USD")) -> int:
+    missing = []
+    try:
+        async with DatabaseFacade.session_scope() as db:
+            # small tables are scanned sequentially anyway, here it is only checked that index is usable
+            await db.execute(text("SET LOCAL enable_seqscan = off"))
+            for index_name, query in CHECKED_QUERIES.items():
+                plan = (await db.execute(text(
+                    "EXPLAIN (FORMAT JSON) " + query.replace("{{user_id}}", str(user_id))
+                                                    .replace("{{pivot_currency}}", pivot_currency)
+                ))).scalar_one()
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                used_indexes = get_used_indexes(plan[0]["Plan"])
+                print(f"{index_name}: {'used' if index_name in used_indexes else 'NOT used'} "
+                      f"(plan indexes: {sorted(used_indexes)})")
+                if index_name not in used_indexes:
+                    missing.append(index_name)
+            await db.rollback()
+    finally:
+        await DatabaseFacade.get_async_engine().dispose()
+    return 1 if missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 0)))
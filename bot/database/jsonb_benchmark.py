@@ -0,0 +1,146 @@
+"""
+Times the JSON paths of the report and of Superset-like queries on the migrated schema, over a generated dataset.
+Users, properties, rates tables and expenses are generated in the expense_bot tables, then timed
+with jsonb columns, with an expression index on base currency and with columns converted back to json.
+Everything happens in one transaction that is rolled back, the tables stay locked until then,
+so run it against a scratch database: `alembic upgrade head` on an empty one is enough.
+
+Usage (from the bot directory): python -m database.jsonb_benchmark [users] [days]
+"""
+import asyncio
+import json
+import os
+import sys
+from statistics import median
+
+from sqlalchemy import text
+
+from database.database import DatabaseFacade
+from database.index_usage_check import get_used_indexes
+from resources.analytics_sql_templates import DEFAULT_WEEKLY_REPORT
+from resources.currency_rate_extractor import SUPPORTED_BASE_CURRENCIES
+
+RUNS = 3
+EXPRESSION_INDEX = "ix_users_properties_base_currency"
+
+# generated users get negative ids, Telegram ids of real users are positive
+SETUP_STATEMENTS = [
+    """
+    INSERT INTO expense_bot.users (id, role, created_at, updated_at)
+    SELECT -u, 'viewer', now(), now() FROM generate_series(1, {{users}}) AS u
+    """,
+    """
+    INSERT INTO expense_bot.users_properties (property_id, user_id, property_value, created_at, updated_at)
+    SELECT p.id, -u, jsonb_build_object('base_currency', (ARRAY{{currencies}})[1 + u % {{currency_count}}]),
+           now(), now()
+    FROM generate_series(1, {{users}}) AS u
+    CROSS JOIN expense_bot.properties p
+    WHERE p.name = 'base_currency'
+    """,
+    """
+    INSERT INTO expense_bot.currency_rates (id, rate_date, base, rates, created_at, updated_at)
+    SELECT gen_random_uuid(), CURRENT_DATE - d, '{{pivot_currency}}',
+           (SELECT jsonb_object_agg(c, CASE WHEN c = '{{pivot_currency}}' THEN 1
+                                             ELSE round((random() * 100 + 1)::numeric, 4) END)
+            FROM unnest(ARRAY{{currencies}}) AS c),
+           now(), now()
+    FROM generate_series(0, {{days}} - 1) AS d
+    ON CONFLICT (rate_date, base) DO NOTHING
+    """,
+    """
+    INSERT INTO expense_bot.expenses (id, user_id, message_id, category_id, spent_on, amount, currency,
+                                      currency_rate_id, base_currency, amount_in_base_currency,
+                                      needs_rerating, created_at)
+    SELECT gen_random_uuid(), -(1 + e % {{users}}), e, c.id, cr.rate_date,
+           round((random() * 1000)::numeric, 2), (ARRAY{{currencies}})[1 + e % {{currency_count}}],
+           cr.id, (ARRAY{{currencies}})[1 + e % {{currency_count}}], NULL, false, now()
+    FROM generate_series(1, {{users}} * 20) AS e
+    JOIN expense_bot.currency_rates cr
+        ON cr.rate_date = CURRENT_DATE - e % {{days}} AND cr.base = '{{pivot_currency}}'
+    JOIN LATERAL (
+        SELECT id FROM expense_bot.categories ORDER BY id OFFSET e % 5 LIMIT 1
+    ) c ON TRUE
+    """,
+]
+
+TIMED_QUERIES = {
+    # base_currency CTE of the report, for every user at once as a Superset chart by base currency would read it
+    "base currency of users": """
+        SELECT up.user_id, COALESCE(property_value->>'base_currency', 'USD') AS base_currency
+        FROM expense_bot.users_properties up
+        JOIN expense_bot.properties p ON up.property_id = p.id
+        WHERE p.name = 'base_currency'
+    """,
+    # the only query shape an expression index on base currency could serve, no query of the bot has it
+    "users with EUR base currency": """
+        SELECT up.user_id
+        FROM expense_bot.users_properties up
+        WHERE property_value->>'base_currency' = 'EUR'
+    """,
+    "expenses in base currency": """
+        SELECT sum(e.amount / nullif((cr.rates->>e.currency)::float, 0)
+                   * (cr.rates->>(up.property_value->>'base_currency'))::float)
+        FROM expense_bot.expenses e
+        JOIN expense_bot.currency_rates cr ON cr.id = e.currency_rate_id
+        JOIN expense_bot.users_properties up ON up.user_id = e.user_id
+        JOIN expense_bot.properties p ON up.property_id = p.id AND p.name = 'base_currency'
+        WHERE e.user_id < 0
+    """,
+    "weekly report of one user": DEFAULT_WEEKLY_REPORT.replace("{{user_id}}", "-1"),
+}
+
+SETUPS = {
+    "jsonb": [],
+    "jsonb + index": [
+        f"CREATE INDEX {EXPRESSION_INDEX} ON expense_bot.users_properties ((property_value->>'base_currency'))",
+    ],
+    "json": [
+        f"DROP INDEX expense_bot.{EXPRESSION_INDEX}",
+        "ALTER TABLE expense_bot.users_properties ALTER COLUMN property_value TYPE json USING property_value::json",
+        "ALTER TABLE expense_bot.currency_rates ALTER COLUMN rates TYPE json USING rates::json",
+    ],
+}
+
+
+def render(query: str, users: int, days: int, pivot_currency: str) -> str:
+    currencies = [pivot_currency] + [c for c in SUPPORTED_BASE_CURRENCIES if c != pivot_currency]
+    return query.replace("{{currencies}}", "[" + ", ".join(f"'{currency}'" for currency in currencies) + "]") \
+        .replace("{{currency_count}}", str(len(currencies))) \
+        .replace("{{users}}", str(users)) \
+        .replace("{{days}}", str(days)) \
+        .replace("{{pivot_currency}}", pivot_currency)
+
+
+async def main(users: int, days: int, pivot_currency: str = os.getenv("CURRENCY_RATES_PIVOT", "USD")) -> int:
+    try:
+        async with DatabaseFacade.session_scope() as db:
+            for statement in SETUP_STATEMENTS:
+                await db.execute(text(render(statement, users, days, pivot_currency)))
+
+            for setup_name, statements in SETUPS.items():
+                for statement in statements:
+                    await db.execute(text(statement))
+                await db.execute(text("ANALYZE expense_bot.users_properties, expense_bot.currency_rates, "
+                                      "expense_bot.expenses, expense_bot.weekly_category_totals"))
+                for name, query in TIMED_QUERIES.items():
+                    timings, used_indexes = [], set()
+                    for _ in range(RUNS):
+                        plan = (await db.execute(text(
+                            "EXPLAIN (ANALYZE, FORMAT JSON) " + render(query, users, days, pivot_currency)
+                        ))).scalar_one()
+                        plan = json.loads(plan) if isinstance(plan, str) else plan
+                        timings.append(plan[0]["Execution Time"])
+                        used_indexes |= get_used_indexes(plan[0]["Plan"])
+                    print(f"{setup_name}: {name}: {median(timings):.1f} ms (median of {RUNS}), "
+                          f"{EXPRESSION_INDEX} {'used' if EXPRESSION_INDEX in used_indexes else 'not used'}")
+            await db.rollback()
+    finally:
+        await DatabaseFacade.get_async_engine().dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 10000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 365
+    )))
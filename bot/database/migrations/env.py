@@ -11,7 +11,10 @@ from database.models import (
     UsersProperties,
     Properties,
     Categories,
-    Expenses
+    CurrencyRates,
+    Expenses,
+    FsmStates,
+    WeeklyCategoryTotals
 )
 
 # this is the Alembic Config object, which provides
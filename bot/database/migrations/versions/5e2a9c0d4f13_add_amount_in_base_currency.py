@@ -0,0 +1,86 @@
+"""add amount_in_base_currency
+
+Revision ID: 5e2a9c0d4f13
+Revises: c81e4b7d92af
+Create Date: 2026-10-18 14:41:33.027654
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2a9c0d4f13'
+down_revision: Union[str, None] = 'c81e4b7d92af'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        table_name='expenses',
+        column=sa.Column('base_currency', sa.String(), nullable=True),
+        schema='expense_bot'
+    )
+    op.add_column(
+        table_name='expenses',
+        column=sa.Column('amount_in_base_currency', sa.Float(), nullable=True),
+        schema='expense_bot'
+    )
+    # backfill with base currency users have now, amount stays NULL when rates of expense date are unknown
+    op.execute("""
+        UPDATE expense_bot.expenses e SET
+            base_currency = bc.base_currency,
+            amount_in_base_currency = CASE
+                WHEN e.currency = bc.base_currency THEN e.amount
+                ELSE e.amount /
+                    nullif((cr.rates->>e.currency)::float, 0) *
+                    nullif((cr.rates->>bc.base_currency)::float, 0)
+            END
+        FROM
+            expense_bot.currency_rates cr,
+            (
+                SELECT
+                    up.user_id,
+                    COALESCE(up.property_value->>'base_currency', 'USD') AS base_currency
+                FROM expense_bot.users_properties up
+                JOIN expense_bot.properties p ON up.property_id = p.id
+                WHERE p.name = 'base_currency'
+            ) bc
+        WHERE
+            cr.id = e.currency_rate_id
+            AND bc.user_id = e.user_id
+    """)
+
+    op.drop_index('ix_expenses_user_id_spent_on', table_name='expenses', schema='expense_bot')
+    op.create_index(
+        'ix_expenses_user_id_spent_on',
+        'expenses',
+        ['user_id', 'spent_on'],
+        postgresql_include=['category_id', 'amount', 'currency', 'created_at',
+                            'base_currency', 'amount_in_base_currency'],
+        schema='expense_bot'
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_expenses_user_id_spent_on', table_name='expenses', schema='expense_bot')
+    op.create_index(
+        'ix_expenses_user_id_spent_on',
+        'expenses',
+        ['user_id', 'spent_on'],
+        postgresql_include=['category_id', 'amount', 'currency', 'created_at'],
+        schema='expense_bot'
+    )
+    op.drop_column(
+        table_name='expenses',
+        column_name='amount_in_base_currency',
+        schema='expense_bot'
+    )
+    op.drop_column(
+        table_name='expenses',
+        column_name='base_currency',
+        schema='expense_bot'
+    )
@@ -0,0 +1,53 @@
+"""add expenses needs_rerating
+
+Revision ID: 7d4b1e9a3c25
+Revises: 5e2a9c0d4f13
+Create Date: 2026-10-18 16:12:08.402917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d4b1e9a3c25'
+down_revision: Union[str, None] = '5e2a9c0d4f13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        table_name='expenses',
+        column=sa.Column('needs_rerating', sa.Boolean(), nullable=False, server_default=sa.false()),
+        schema='expense_bot'
+    )
+    # expenses saved while all rate providers were down reference zero-filled tables
+    op.execute("""
+        UPDATE expense_bot.expenses e SET needs_rerating = true
+        FROM expense_bot.currency_rates cr
+        WHERE
+            cr.id = e.currency_rate_id
+            AND NOT EXISTS (
+                SELECT 1 FROM json_each_text(cr.rates) r WHERE r.value::float > 0
+            )
+    """)
+    # repair queue, stays tiny as flagged rows are unflagged once rerated
+    op.create_index(
+        'ix_expenses_needs_rerating',
+        'expenses',
+        ['currency_rate_id'],
+        postgresql_where=sa.text('needs_rerating'),
+        schema='expense_bot'
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_expenses_needs_rerating', table_name='expenses', schema='expense_bot')
+    op.drop_column(
+        table_name='expenses',
+        column_name='needs_rerating',
+        schema='expense_bot'
+    )
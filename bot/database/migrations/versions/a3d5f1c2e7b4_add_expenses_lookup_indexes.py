@@ -0,0 +1,41 @@
+"""add expenses lookup indexes
+
+Revision ID: a3d5f1c2e7b4
+Revises: 89c796ed0292
+Create Date: 2026-10-18 12:04:51.118230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d5f1c2e7b4'
+down_revision: Union[str, None] = '89c796ed0292'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # edit / delete of expense by the bot message it was reported in
+    op.create_index(
+        'ix_expenses_user_id_message_id',
+        'expenses',
+        ['user_id', 'message_id'],
+        schema='expense_bot'
+    )
+    # weekly report range scan, covers the columns it aggregates
+    op.create_index(
+        'ix_expenses_user_id_spent_on',
+        'expenses',
+        ['user_id', 'spent_on'],
+        postgresql_include=['category_id', 'amount', 'currency', 'created_at'],
+        schema='expense_bot'
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_expenses_user_id_spent_on', table_name='expenses', schema='expense_bot')
+    op.drop_index('ix_expenses_user_id_message_id', table_name='expenses', schema='expense_bot')
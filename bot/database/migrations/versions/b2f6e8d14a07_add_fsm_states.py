@@ -0,0 +1,36 @@
+"""add fsm_states
+
+Revision ID: b2f6e8d14a07
+Revises: 7d4b1e9a3c25
+Create Date: 2026-10-18 17:03:44.915326
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2f6e8d14a07'
+down_revision: Union[str, None] = '7d4b1e9a3c25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('fsm_states',
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('state', sa.String(), nullable=True),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('key'),
+        schema='expense_bot'
+    )
+    # eviction of abandoned flows
+    op.create_index('ix_fsm_states_updated_at', 'fsm_states', ['updated_at'], schema='expense_bot')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_fsm_states_updated_at', table_name='fsm_states', schema='expense_bot')
+    op.drop_table('fsm_states', schema='expense_bot')
@@ -0,0 +1,98 @@
+"""normalize expense rates to currency_rates
+
+Revision ID: c81e4b7d92af
+Revises: a3d5f1c2e7b4
+Create Date: 2026-10-18 13:26:07.540912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81e4b7d92af'
+down_revision: Union[str, None] = 'a3d5f1c2e7b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('currency_rates',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('rate_date', sa.Date(), nullable=False),
+        sa.Column('base', sa.String(), nullable=False),
+        sa.Column('rates', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('rate_date', 'base', name='uq_currency_rates_rate_date_base'),
+        schema='expense_bot'
+    )
+    # one table per (date, base), zero-filled tables (all providers failed) lose to a valid one
+    op.execute("""
+        INSERT INTO expense_bot.currency_rates (id, rate_date, base, rates, created_at, updated_at)
+        SELECT DISTINCT ON (e.spent_on, e.rates->>'base')
+            gen_random_uuid(),
+            e.spent_on,
+            e.rates->>'base',
+            e.rates->'rates',
+            CURRENT_TIMESTAMP,
+            CURRENT_TIMESTAMP
+        FROM expense_bot.expenses e
+        ORDER BY
+            e.spent_on,
+            e.rates->>'base',
+            COALESCE((e.rates->'rates'->>(e.rates->>'base'))::float, 0) = 0,
+            e.created_at DESC
+    """)
+
+    op.add_column(
+        table_name='expenses',
+        column=sa.Column('currency_rate_id', sa.UUID(), nullable=True),
+        schema='expense_bot'
+    )
+    op.execute("""
+        UPDATE expense_bot.expenses e SET
+            currency_rate_id = cr.id
+        FROM expense_bot.currency_rates cr
+        WHERE
+            cr.rate_date = e.spent_on
+            AND cr.base = e.rates->>'base'
+    """)
+    op.alter_column('expenses', 'currency_rate_id', nullable=False, schema='expense_bot')
+    op.create_foreign_key(
+        'expenses_currency_rate_id_fkey',
+        'expenses', 'currency_rates',
+        ['currency_rate_id'], ['id'],
+        source_schema='expense_bot',
+        referent_schema='expense_bot'
+    )
+    op.drop_column(
+        table_name='expenses',
+        column_name='rates',
+        schema='expense_bot'
+    )
+
+
+def downgrade() -> None:
+    op.add_column(
+        table_name='expenses',
+        column=sa.Column('rates', sa.JSON(), nullable=True),
+        schema='expense_bot'
+    )
+    op.execute("""
+        UPDATE expense_bot.expenses e SET
+            rates = json_build_object('base', cr.base, 'rates', cr.rates)
+        FROM expense_bot.currency_rates cr
+        WHERE cr.id = e.currency_rate_id
+    """)
+    op.alter_column('expenses', 'rates', nullable=False, schema='expense_bot')
+    op.drop_constraint('expenses_currency_rate_id_fkey', 'expenses', type_='foreignkey', schema='expense_bot')
+    op.drop_column(
+        table_name='expenses',
+        column_name='currency_rate_id',
+        schema='expense_bot'
+    )
+    op.drop_table('currency_rates', schema='expense_bot')
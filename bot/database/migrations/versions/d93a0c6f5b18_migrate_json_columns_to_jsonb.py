@@ -0,0 +1,42 @@
+"""migrate json columns to jsonb
+
+Revision ID: d93a0c6f5b18
+Revises: b2f6e8d14a07
+Create Date: 2026-10-18 19:21:50.604113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd93a0c6f5b18'
+down_revision: Union[str, None] = 'b2f6e8d14a07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ->> on jsonb reads a parsed binary value instead of reparsing text on every access
+    op.alter_column('users_properties', 'property_value',
+                    type_=postgresql.JSONB(),
+                    postgresql_using='property_value::jsonb',
+                    schema='expense_bot')
+    op.alter_column('currency_rates', 'rates',
+                    type_=postgresql.JSONB(),
+                    postgresql_using='rates::jsonb',
+                    schema='expense_bot')
+
+
+def downgrade() -> None:
+    op.alter_column('currency_rates', 'rates',
+                    type_=sa.JSON(),
+                    postgresql_using='rates::json',
+                    schema='expense_bot')
+    op.alter_column('users_properties', 'property_value',
+                    type_=sa.JSON(),
+                    postgresql_using='property_value::json',
+                    schema='expense_bot')
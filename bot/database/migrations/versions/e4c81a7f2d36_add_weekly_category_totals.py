@@ -0,0 +1,126 @@
+"""add weekly_category_totals
+
+Revision ID: e4c81a7f2d36
+Revises: d93a0c6f5b18
+Create Date: 2026-10-18 20:12:07.338541
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4c81a7f2d36'
+down_revision: Union[str, None] = 'd93a0c6f5b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('weekly_category_totals',
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('week_start', sa.Date(), nullable=False),
+        sa.Column('category_id', sa.UUID(), nullable=False),
+        sa.Column('base_currency', sa.String(), nullable=False),
+        sa.Column('amount', sa.Numeric(15, 2), nullable=False),
+        sa.Column('expense_count', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.text('now()')),
+        sa.ForeignKeyConstraint(['category_id'], ['expense_bot.categories.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['expense_bot.users.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'week_start', 'category_id', 'base_currency',
+                                name='pk_weekly_category_totals'),
+        schema='expense_bot'
+    )
+    # every write path (save, edit, delete, rate repair) goes through expenses, so totals are kept in the trigger.
+    # Expenses without precomputed amount in base currency are counted in their own currency,
+    # each amount is rounded to cents as the report did before summing
+    op.execute("""
+        CREATE FUNCTION expense_bot.apply_weekly_category_total(
+            p_user_id bigint, p_spent_on date, p_category_id uuid, p_currency varchar, p_amount double precision,
+            p_base_currency varchar, p_amount_in_base_currency double precision, p_sign integer
+        ) RETURNS void AS $$
+        DECLARE
+            v_week_start date := DATE_TRUNC('week', p_spent_on)::date;
+            v_base_currency varchar := CASE WHEN p_amount_in_base_currency IS NULL THEN p_currency
+                                            ELSE COALESCE(p_base_currency, p_currency) END;
+            v_amount numeric(15,2) := COALESCE(p_amount_in_base_currency, p_amount)::decimal(15,2);
+        BEGIN
+            INSERT INTO expense_bot.weekly_category_totals AS t
+                (user_id, week_start, category_id, base_currency, amount, expense_count, updated_at)
+            VALUES
+                (p_user_id, v_week_start, p_category_id, v_base_currency, p_sign * v_amount, p_sign, now())
+            ON CONFLICT ON CONSTRAINT pk_weekly_category_totals DO UPDATE SET
+                amount = t.amount + EXCLUDED.amount,
+                expense_count = t.expense_count + EXCLUDED.expense_count,
+                updated_at = EXCLUDED.updated_at;
+
+            DELETE FROM expense_bot.weekly_category_totals
+            WHERE
+                user_id = p_user_id
+                AND week_start = v_week_start
+                AND category_id = p_category_id
+                AND base_currency = v_base_currency
+                AND expense_count <= 0;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE FUNCTION expense_bot.maintain_weekly_category_totals() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM expense_bot.apply_weekly_category_total(
+                    OLD.user_id, OLD.spent_on, OLD.category_id, OLD.currency, OLD.amount,
+                    OLD.base_currency, OLD.amount_in_base_currency, -1);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM expense_bot.apply_weekly_category_total(
+                    NEW.user_id, NEW.spent_on, NEW.category_id, NEW.currency, NEW.amount,
+                    NEW.base_currency, NEW.amount_in_base_currency, 1);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_expenses_weekly_category_totals
+        AFTER INSERT OR DELETE
+            OR UPDATE OF user_id, spent_on, category_id, currency, amount, base_currency, amount_in_base_currency
+        ON expense_bot.expenses
+        FOR EACH ROW EXECUTE FUNCTION expense_bot.maintain_weekly_category_totals()
+    """)
+    op.execute("""
+        INSERT INTO expense_bot.weekly_category_totals
+            (user_id, week_start, category_id, base_currency, amount, expense_count, updated_at)
+        SELECT
+            user_id,
+            DATE_TRUNC('week', spent_on)::date,
+            category_id,
+            CASE WHEN amount_in_base_currency IS NULL THEN currency ELSE COALESCE(base_currency, currency) END,
+            SUM(COALESCE(amount_in_base_currency, amount)::decimal(15,2)),
+            COUNT(*),
+            now()
+        FROM expense_bot.expenses
+        GROUP BY 1, 2, 3, 4
+    """)
+    # the report no longer reads expenses, keep the key columns only for date range filters on a user's expenses
+    op.drop_index('ix_expenses_user_id_spent_on', table_name='expenses', schema='expense_bot')
+    op.create_index('ix_expenses_user_id_spent_on', 'expenses', ['user_id', 'spent_on'], schema='expense_bot')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_expenses_user_id_spent_on', table_name='expenses', schema='expense_bot')
+    op.create_index(
+        'ix_expenses_user_id_spent_on',
+        'expenses',
+        ['user_id', 'spent_on'],
+        postgresql_include=['category_id', 'amount', 'currency', 'created_at',
+                            'base_currency', 'amount_in_base_currency'],
+        schema='expense_bot'
+    )
+    op.execute("DROP TRIGGER trg_expenses_weekly_category_totals ON expense_bot.expenses")
+    op.execute("DROP FUNCTION expense_bot.maintain_weekly_category_totals()")
+    op.execute("DROP FUNCTION expense_bot.apply_weekly_category_total("
+               "bigint, date, uuid, varchar, double precision, varchar, double precision, integer)")
+    op.drop_table('weekly_category_totals', schema='expense_bot')
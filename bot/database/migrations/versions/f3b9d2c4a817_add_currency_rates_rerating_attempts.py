@@ -0,0 +1,37 @@
+"""add currency_rates rerating attempts
+
+Revision ID: f3b9d2c4a817
+Revises: e4c81a7f2d36
+Create Date: 2026-10-18 22:41:15.207314
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b9d2c4a817'
+down_revision: Union[str, None] = 'e4c81a7f2d36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # failed repairs of a zero-filled table are retried with a growing delay, see job_repair_zero_rated_expenses
+    op.add_column(
+        table_name='currency_rates',
+        column=sa.Column('rerating_attempts', sa.Integer(), nullable=False, server_default='0'),
+        schema='expense_bot'
+    )
+    op.add_column(
+        table_name='currency_rates',
+        column=sa.Column('rerating_attempted_at', sa.DateTime(), nullable=True),
+        schema='expense_bot'
+    )
+
+
+def downgrade() -> None:
+    op.drop_column(table_name='currency_rates', column_name='rerating_attempted_at', schema='expense_bot')
+    op.drop_column(table_name='currency_rates', column_name='rerating_attempts', schema='expense_bot')
@@ -2,4 +2,7 @@ from database.models.categories import Categories
 from database.models.users import Users
 from database.models.properties import Properties
 from database.models.users_properties import UsersProperties
+from database.models.currency_rates import CurrencyRates
 from database.models.expenses import Expenses
+from database.models.fsm_states import FsmStates
+from database.models.weekly_category_totals import WeeklyCategoryTotals
@@ -0,0 +1,42 @@
+from typing import Any, Dict
+from datetime import datetime
+import uuid
+
+from sqlalchemy import Column, Date, DateTime, Integer, String, UUID, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import relationship
+
+from database import Base
+
+
+class CurrencyRates(Base):
+    """
+    CurrencyRates class represents a table of currency rates for a date and base currency in the database.
+    """
+
+    __tablename__ = "currency_rates"
+    __table_args__ = (
+        UniqueConstraint("rate_date", "base", name="uq_currency_rates_rate_date_base"),
+    )
+    currency_rate_id = Column("id", UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    rate_date = Column("rate_date", Date, nullable=False)
+    base = Column("base", String, nullable=False)
+    rates = Column("rates", JSONB, nullable=False)
+    created_at = Column("created_at", DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column("updated_at", DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    rerating_attempts = Column("rerating_attempts", Integer, nullable=False, default=0)
+    rerating_attempted_at = Column("rerating_attempted_at", DateTime)
+
+    expenses = relationship("Expenses", back_populates="currency_rates")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(
+            currency_rate_id=self.currency_rate_id,
+            rate_date=self.rate_date,
+            base=self.base,
+            rates=self.rates,
+            created_at=self.created_at,
+            updated_at=self.updated_at,
+            rerating_attempts=self.rerating_attempts,
+            rerating_attempted_at=self.rerating_attempted_at,
+        )
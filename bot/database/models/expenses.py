@@ -2,7 +2,7 @@ from typing import Any, Dict
 from datetime import datetime
 import uuid
 
-from sqlalchemy import BigInteger, Float, Column, DateTime, Date, String, ForeignKey, UUID, JSON, func
+from sqlalchemy import BigInteger, Boolean, Float, Column, DateTime, Date, String, ForeignKey, UUID, Index, func, text
 from sqlalchemy.orm import relationship
 
 from database import Base
@@ -14,6 +14,11 @@ class Expenses(Base):
     """
 
     __tablename__ = "expenses"
+    __table_args__ = (
+        Index("ix_expenses_user_id_message_id", "user_id", "message_id"),
+        Index("ix_expenses_user_id_spent_on", "user_id", "spent_on"),
+        Index("ix_expenses_needs_rerating", "currency_rate_id", postgresql_where=text("needs_rerating")),
+    )
     expense_id = Column("id", UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column("user_id", BigInteger, ForeignKey("users.id"), nullable=False)
     message_id = Column("message_id", BigInteger, nullable=False)
@@ -21,13 +26,17 @@ class Expenses(Base):
     spent_on = Column("spent_on", Date, nullable=False, default=func.current_date)
     amount = Column("amount", Float, nullable=False)
     currency = Column("currency", String, nullable=False, default="USD")
-    rates = Column("rates", JSON, nullable=False)
+    currency_rate_id = Column("currency_rate_id", UUID(as_uuid=True), ForeignKey("currency_rates.id"), nullable=False)
+    base_currency = Column("base_currency", String)
+    amount_in_base_currency = Column("amount_in_base_currency", Float)
+    needs_rerating = Column("needs_rerating", Boolean, nullable=False, default=False)
     comment = Column("comment", String)
     created_at = Column("created_at", DateTime, nullable=False, default=datetime.utcnow)
     # updated_at = Column("updated_at", DateTime, nullable=False, default=datetime.utcnow(), onupdate=func.now())
 
     users = relationship("Users", back_populates="expenses")
     categories = relationship("Categories", back_populates="expenses")
+    currency_rates = relationship("CurrencyRates", back_populates="expenses")
 
     def to_dict(self) -> Dict[str, Any]:
         return dict(
@@ -38,7 +47,10 @@ class Expenses(Base):
             spent_on=self.spent_on,
             amount=self.amount,
             currency=self.currency,
-            rates=self.rates,
+            currency_rate_id=self.currency_rate_id,
+            base_currency=self.base_currency,
+            amount_in_base_currency=self.amount_in_base_currency,
+            needs_rerating=self.needs_rerating,
             comment=self.comment,
             created_at=self.created_at,
             # updated_at=self.updated_at,
@@ -0,0 +1,29 @@
+from typing import Any, Dict
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, String, LargeBinary, Index
+
+from database import Base
+
+
+class FsmStates(Base):
+    """
+    FsmStates class represents a state and data of a conversation flow (aiogram FSM) in the database.
+    """
+
+    __tablename__ = "fsm_states"
+    __table_args__ = (
+        Index("ix_fsm_states_updated_at", "updated_at"),
+    )
+    key = Column("key", String, primary_key=True)
+    state = Column("state", String)
+    data = Column("data", LargeBinary, nullable=False)
+    updated_at = Column("updated_at", DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(
+            key=self.key,
+            state=self.state,
+            data=self.data,
+            updated_at=self.updated_at,
+        )
@@ -1,7 +1,8 @@
 from typing import Any, Dict
 from datetime import datetime
 
-from sqlalchemy import BigInteger, Column, DateTime, JSON, ForeignKey, UUID, func, PrimaryKeyConstraint
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, UUID, func, PrimaryKeyConstraint
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 
 from database import Base
@@ -18,7 +19,7 @@ class UsersProperties(Base):
     )
     property_id = Column("property_id", UUID(as_uuid=True), ForeignKey("properties.id"))
     user_id = Column("user_id", BigInteger, ForeignKey("users.id"))
-    property_value = Column("property_value", JSON, nullable=False)
+    property_value = Column("property_value", JSONB, nullable=False)
     created_at = Column("created_at", DateTime, nullable=False, default=datetime.utcnow)
     updated_at = Column("updated_at", DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
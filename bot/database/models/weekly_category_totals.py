@@ -0,0 +1,38 @@
+from typing import Any, Dict
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Column, DateTime, Date, Integer, Numeric, String, ForeignKey, UUID, \
+    PrimaryKeyConstraint
+
+from database import Base
+
+
+class WeeklyCategoryTotals(Base):
+    """
+    WeeklyCategoryTotals class represents a sum of expenses of a user per week and category in the database.
+    Rows are maintained by `trg_expenses_weekly_category_totals` trigger on expenses, not by the bot.
+    """
+
+    __tablename__ = "weekly_category_totals"
+    __table_args__ = (
+        PrimaryKeyConstraint("user_id", "week_start", "category_id", "base_currency",
+                             name="pk_weekly_category_totals"),
+    )
+    user_id = Column("user_id", BigInteger, ForeignKey("users.id"))
+    week_start = Column("week_start", Date)
+    category_id = Column("category_id", UUID(as_uuid=True), ForeignKey("categories.id"))
+    base_currency = Column("base_currency", String)
+    amount = Column("amount", Numeric(15, 2), nullable=False)
+    expense_count = Column("expense_count", Integer, nullable=False)
+    updated_at = Column("updated_at", DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(
+            user_id=self.user_id,
+            week_start=self.week_start,
+            category_id=self.category_id,
+            base_currency=self.base_currency,
+            amount=self.amount,
+            expense_count=self.expense_count,
+            updated_at=self.updated_at,
+        )
@@ -1,16 +1,23 @@
 from abc import abstractmethod
 import re
 from datetime import datetime as dt
-from uuid import uuid4
+from uuid import UUID, uuid4
 
 from aiogram import (
     types,
     Bot
 )
 from aiogram.fsm.context import FSMContext
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from resources.states import States
-from resources.currency_rate_extractor import CurrencyRateExtractor
+from resources.currency_rate_extractor import CurrencyRateExtractor, SUPPORTED_BASE_CURRENCIES
+from resources.currency_rate_cache import CurrencyRateCache
+from resources.rate_history_store import RateHistoryStore
+from resources.user_properties_cache import UserPropertiesCache
+from resources.reference_data import ReferenceData
 from resources import interface_messages
 from resources.editing_labels import EditingLabels
 from resources.expense_attributes import ExpenseAttribute
@@ -19,7 +26,7 @@ from database.database import DatabaseFacade
 from database.models import (
     Expenses,
     Categories,
-    UsersProperties
+    CurrencyRates
 )
 from logger import Logger
 
@@ -30,8 +37,12 @@ class AbstractRouterBuilder:
         self.logger = logger
         self.db = DatabaseFacade()
         self.router = None
-        self.supported_base_currencies = ["USD", "EUR", "RUB", "TRY", "GEL", "RSD", "AMD"]
-        self.currency_rate_extractor = CurrencyRateExtractor(self.supported_base_currencies)
+        self.supported_base_currencies = SUPPORTED_BASE_CURRENCIES
+        self.currency_rate_extractor = CurrencyRateExtractor(self.supported_base_currencies,
+                                                             CurrencyRateCache.get_shared(),
+                                                             rate_history=RateHistoryStore.get_shared())
+        self.user_properties = UserPropertiesCache.get_shared()
+        self.reference_data = ReferenceData.get_shared()
 
     @abstractmethod
     def build_default_router(self):
@@ -96,39 +107,69 @@ class AbstractRouterBuilder:
         return True
 
     async def get_base_currency(self, user_id):
-        with self.db.get_session() as db:
-            base_currency = db.query(UsersProperties.property_value) \
-                .filter(UsersProperties.properties.has(property_name="base_currency"),
-                        UsersProperties.users.has(user_id=user_id)) \
-                .first()[0]
-        return base_currency["base_currency"]
+        return (await self.user_properties.get(user_id, "base_currency"))["base_currency"]
 
-    async def __add_expense_to_db(self, expense_data: dict):
+    async def __build_expense_payload(self, expense_data: dict) -> tuple[dict, dict]:
+        base_currency = await self.get_base_currency(expense_data["user_id"])
         if not expense_data["currency"]:
-            expense_data["currency"] = await self.get_base_currency(expense_data["user_id"])
+            expense_data["currency"] = base_currency
         self.logger.log(self, "", f"{expense_data}")
-        rates = await self.get_rates_on_expense_date(expense_data["spent_on"], expense_data["currency"])
-        payload = {
+        rates = await self.currency_rate_extractor.extract_pivot_rates(expense_data["spent_on"])
+        return {
             "expense_id": expense_data["expense_id"],
             "user_id": expense_data["user_id"],
-            "spent_on": expense_data["spent_on"],
+            "spent_on": dt.strptime(expense_data["spent_on"], '%Y-%m-%d').date(),
             "amount": expense_data["amount"],
             "currency": expense_data["currency"],
-            "rates": rates,
+            "base_currency": base_currency,
+            "amount_in_base_currency": CurrencyRateExtractor.convert(
+                expense_data["amount"], expense_data["currency"], base_currency, rates["rates"]
+            ),
+            # all providers failed, rates are zero-filled until the repair job rerates the expense
+            "needs_rerating": not any(rates["rates"].values()),
             "comment": expense_data["comment"],
-        }
+        }, rates
+
+    async def __add_expense_to_db(self, payload: dict, category: str, rates: dict) -> str | None:
+        """Inserts expense in one transaction, returns error text if it failed."""
         try:
-            with self.db.get_session() as db:
-                payload["category_id"] = db.query(Categories.category_id) \
-                        .filter(Categories.category_name == expense_data["category"]) \
-                        .first()[0]
-                db.add(Expenses(**payload))
-                db.commit()
+            with self.db.count_statements() as statements:
+                async with self.db.get_async_session() as db:
+                    payload["category_id"] = await self.reference_data.get_category_id(category)
+                    payload["currency_rate_id"] = await self.__get_currency_rate_id(
+                        db, payload["spent_on"].isoformat(), rates
+                    )
+                    db.add(Expenses(**payload))
+                    await db.commit()
+            self.logger.log(self, payload["user_id"], f"Expense {payload['expense_id']} saved, {statements}")
         except Exception as e:
-            payload["error"] = str(e)
-            self.logger.log(self, expense_data.get("message").from_user.id, str(payload))
+            self.logger.log(self, payload["user_id"], str({**payload, "error": str(e)}))
+            return str(e)
 
-        return payload
+    @staticmethod
+    async def __get_currency_rate_id(db_session: AsyncSession, on_date: str, rates: dict):
+        """
+        Returns id of rates table for (date, base), the table is saved if it is not stored yet.
+        Stored tables are refreshed by the rate cache, so an existing row is never rewritten here:
+        a zero-filled table of this request must not replace a valid one stored concurrently.
+        """
+        rate_date = dt.strptime(on_date, '%Y-%m-%d').date()
+        select_id = select(CurrencyRates.currency_rate_id).filter(
+            CurrencyRates.rate_date == rate_date,
+            CurrencyRates.base == rates["base"]
+        )
+        currency_rate_id = await db_session.scalar(select_id)
+        if currency_rate_id is None:
+            statement = insert(CurrencyRates).values(
+                rate_date=rate_date,
+                base=rates["base"],
+                rates=rates["rates"]
+            ).on_conflict_do_nothing(index_elements=["rate_date", "base"])
+            currency_rate_id = await db_session.scalar(statement.returning(CurrencyRates.currency_rate_id))
+        if currency_rate_id is None:
+            # inserted by a concurrent writer between select and insert
+            currency_rate_id = await db_session.scalar(select_id)
+        return currency_rate_id
 
     async def __split_expense_amount(self, amount: str):
         """Splits expense amount to amount and currency code (if it is provided)."""
@@ -137,127 +178,155 @@ class AbstractRouterBuilder:
             return (float(amount), None)
         return (float(amount_split[0]), amount_split[1].upper())
 
-    async def __add_message_id_to_expense(self, expense_id: str, message_id: int):
-        with self.db.get_session() as db:
-            db.bulk_update_mappings(Expenses, [{
-                "expense_id": expense_id,
-                "message_id": message_id
-            }])
-            db.commit()
-
     async def report_expense_details(self, expense_data: dict):
         message: types.Message = expense_data.get("message")
-        expense_date_formatted = dt.strptime(expense_data["spent_on"], '%Y-%m-%d') \
-            .strftime("%B %d %Y (%A)")
         expense_data["expense_id"] = uuid4()
         expense_data["amount"], expense_data["currency"] = (
             await self.__split_expense_amount(str(expense_data["amount"])))
 
-        payload = await self.__add_expense_to_db(expense_data)
-        reporting_data = (f"    Date: {expense_date_formatted}\n"
-                          f"    Category: {expense_data['category']}\n"
-                          f"    Amount: {payload['amount']} {payload['currency']}\n"
-                          f"    Comment: `{payload['comment']}`")
-        if not payload.get("error"):
-            report_msg = interface_messages.SUCCESS_RECORD + reporting_data
-            reply_markup = build_edit_mode_main_keyboard()
-        else:
-            report_msg = interface_messages.FAILED_RECORD + reporting_data \
-                + "\n" + str(payload.get("error"))
-            reply_markup = None
-        msg = await message.reply(text=report_msg,
-                                  reply_markup=reply_markup,
+        payload, rates = await self.__build_expense_payload(expense_data)
+        reporting_data = self.format_expense_details({
+            "spent_on": expense_data["spent_on"],
+            "category": expense_data["category"],
+            "amount": payload["amount"],
+            "currency": payload["currency"],
+            "comment": payload["comment"]
+        })
+        # report goes first, so expense is inserted together with its message_id in one transaction;
+        # it says "recorded" and gets edit and delete buttons only when the expense is committed
+        msg = await message.reply(text=interface_messages.SAVING_RECORD + reporting_data,
                                   parse_mode="Markdown",
                                   disable_notification=True)
+        payload["message_id"] = msg.message_id
 
-        if not payload.get("error"):
-            await self.__add_message_id_to_expense(expense_data["expense_id"], msg.message_id)
+        error = await self.__add_expense_to_db(payload, expense_data["category"], rates)
+        if error:
+            await msg.edit_text(text=interface_messages.FAILED_RECORD + reporting_data + "\n" + error,
+                                parse_mode="Markdown")
+        else:
+            await msg.edit_text(text=interface_messages.SUCCESS_RECORD + reporting_data,
+                                parse_mode="Markdown",
+                                reply_markup=build_edit_mode_main_keyboard(expense_data["expense_id"]))
+
+    @staticmethod
+    def format_expense_details(expense: dict) -> str:
+        return (f"    Date: {dt.strptime(expense['spent_on'], '%Y-%m-%d').strftime('%B %d %Y (%A)')}\n"
+                f"    Category: {expense['category']}\n"
+                f"    Amount: {expense['amount']} {expense['currency']}\n"
+                f"    Comment: `{expense['comment']}`")
+
+    async def get_expense_under_edit(self, message: types.Message, expense_id: UUID | None = None) -> dict | None:
+        """
+        Compact record of the expense reported in the message, it is kept in FSM while expense is edited.
+        Expense is found by id from callback data, keyboards of messages sent before ids were packed
+        into callback data fall back to (user_id, message_id) lookup. None if the expense is not saved.
+        """
+        async with self.db.get_async_session() as db:
+            expense = (await db.execute(
+                select(Expenses.expense_id, Expenses.spent_on, Categories.category_name,
+                       Expenses.amount, Expenses.currency, Expenses.comment)
+                .join(Categories, Expenses.category_id == Categories.category_id)
+                .filter(*([Expenses.expense_id == expense_id, Expenses.user_id == message.chat.id]
+                          if expense_id else
+                          [Expenses.user_id == message.chat.id, Expenses.message_id == message.message_id]))
+            )).one_or_none()
+        if expense is None:
+            return None
+        return {
+            "chat_id": message.chat.id,
+            "message_id": message.message_id,
+            "expense_id": str(expense.expense_id),
+            "spent_on": expense.spent_on.isoformat(),
+            "category": expense.category_name,
+            "amount": expense.amount,
+            "currency": expense.currency,
+            "comment": expense.comment,
+        }
 
     async def get_rates_on_expense_date(self, expense_date: str, currency: str):
-        rates = self.currency_rate_extractor.extract_currency_rates(currency, expense_date)
+        rates = await self.currency_rate_extractor.extract_currency_rates(currency, expense_date)
         return {"base": currency, "rates": rates["rates"]}
 
     async def edit_expense_attribute(self,
                                      state: FSMContext,
-                                     attribute: ExpenseAttribute):
+                                     attribute: ExpenseAttribute,
+                                     bot: Bot):
         editing_label = EditingLabels.EDITED.value
         s = await state.get_data()
-        msg: types.Message = s.get("msg_under_edit")
-        edited_data = {}
-        edited_text = msg.text
-        comment = re.search(r'(?<=Comment: ).*$', edited_text, flags=re.M).group(0)
-        edited_text = re.sub(r'(?<=Comment: ).*$', f"`{comment}`", edited_text, flags=re.M)
+        expense = s.get("expense_under_edit")
 
         try:
-            with self.db.get_session() as db:
+            async with self.db.get_async_session() as db:
                 self.logger.log(self, "", f"{s}")
-                expense_id = db.query(Expenses.expense_id).filter(
-                    Expenses.user_id == msg.chat.id,
-                    Expenses.message_id == msg.message_id
-                ).first()[0]
-                edited_data, edited_text = await self.__update_expense_attributes(
+                edited_data, edited_expense = await self.__update_expense_attributes(
                     db_session=db,
                     attribute=attribute,
                     state_data=s,
-                    expense_id=expense_id,
-                    edited_text=edited_text,
-                    base_currency=await self.get_base_currency(msg.chat.id)
+                    expense=expense,
+                    base_currency=await self.get_base_currency(expense["chat_id"])
                 )
-                db.bulk_update_mappings(Expenses, [edited_data])
-                db.commit()
+                await db.execute(update(Expenses), [edited_data])
+                await db.commit()
+            expense = edited_expense
         except Exception as e:
             editing_label = EditingLabels.EDIT_FAILED.value
-            self.logger.log(self, str(msg.chat.id), str(e) + f" {msg}", "error")
+            self.logger.log(self, str(expense["chat_id"]), str(e) + f" {expense}", "error")
 
-        await msg.edit_text(
-            text=(edited_text + f"\n{editing_label}"
-                  if not any(msg.text.endswith(x.value) for x in EditingLabels)
-                  else edited_text.replace(EditingLabels.EDITED.value, editing_label)
-                                  .replace(EditingLabels.EDIT_FAILED.value, editing_label)
-                                  .replace(EditingLabels.DELETION_FAILED.value, editing_label)),
+        await bot.edit_message_text(
+            text=interface_messages.SUCCESS_RECORD + self.format_expense_details(expense) + f"\n{editing_label}",
+            chat_id=expense["chat_id"],
+            message_id=expense["message_id"],
             parse_mode="Markdown",
-            inline_message_id=str(msg.message_id),
-            reply_markup=build_edit_mode_main_keyboard()
+            reply_markup=build_edit_mode_main_keyboard(expense["expense_id"])
         )
 
     async def __update_expense_attributes(self,
                                    db_session,
                                    attribute: ExpenseAttribute,
                                    state_data: dict,
-                                   expense_id: dict,
-                                   edited_text: str,
+                                   expense: dict,
                                    base_currency: str):
-        edited_data = { "expense_id": expense_id }
+        edited_data = { "expense_id": UUID(expense["expense_id"]) }
+        edited_expense = dict(expense)
+        rates = None
         match attribute:
             case ExpenseAttribute.DATE:
                 attribute_value = state_data["db_payload"]["spent_on"]
-                edited_data["rates"] = self.currency_rate_extractor.extract_currency_rates(
-                    base_currency, attribute_value)
-                edited_data["spent_on"] = attribute_value
-                edited_text = re.sub(r'(?<=Date: ).*$',
-                                     dt.strptime(attribute_value, '%Y-%m-%d').strftime("%B %d %Y (%A)"),
-                                     edited_text,
-                                     flags=re.M)
+                rates = await self.currency_rate_extractor.extract_pivot_rates(attribute_value)
+                edited_data["currency_rate_id"] = await self.__get_currency_rate_id(
+                    db_session,
+                    attribute_value,
+                    rates
+                )
+                edited_data["spent_on"] = dt.strptime(attribute_value, '%Y-%m-%d').date()
+                edited_data["needs_rerating"] = not any(rates["rates"].values())
+                edited_expense["spent_on"] = attribute_value
             case ExpenseAttribute.CATEGORY:
                 attribute_value = state_data["db_payload"]["category"]
-                edited_data["category_id"] = db_session.query(Categories.category_id) \
-                    .filter(Categories.category_name == attribute_value) \
-                    .first()[0]
-                edited_text = re.sub(r'(?<=Category: ).*$', attribute_value, edited_text, flags=re.M)
+                edited_data["category_id"] = await self.reference_data.get_category_id(attribute_value)
+                edited_expense["category"] = attribute_value
             case ExpenseAttribute.AMOUNT:
                 amount = state_data["db_payload"]["amount"].split(" ")
-                edited_data["amount"] = amount[0]
+                edited_data["amount"] = float(amount[0])
                 edited_data["currency"] = base_currency if len(amount) == 1 else amount[1].upper()
-                edited_text = re.sub(r'(?<=Amount: ).*$',
-                                     f"{edited_data['amount']} {edited_data['currency']}",
-                                     edited_text,
-                                     flags=re.M)
+                edited_expense["amount"] = edited_data["amount"]
+                edited_expense["currency"] = edited_data["currency"]
+                rates = {"rates": await db_session.scalar(
+                    select(CurrencyRates.rates)
+                    .join(Expenses, Expenses.currency_rate_id == CurrencyRates.currency_rate_id)
+                    .filter(Expenses.expense_id == edited_data["expense_id"])
+                )}
             case ExpenseAttribute.COMMENT:
-                comment = state_data["db_payload"]["comment"]
-                edited_data["comment"] = comment
-                edited_text = re.sub(r'(?<=Comment: ).*$',
-                                     f"`{edited_data['comment']}`",
-                                     edited_text,
-                                     flags=re.M)
+                edited_data["comment"] = state_data["db_payload"]["comment"]
+                edited_expense["comment"] = edited_data["comment"]
+
+        if rates is not None:
+            edited_data["base_currency"] = base_currency
+            edited_data["amount_in_base_currency"] = CurrencyRateExtractor.convert(
+                edited_expense["amount"],
+                edited_expense["currency"],
+                base_currency,
+                rates["rates"]
+            )
 
-        return edited_data, edited_text
+        return edited_data, edited_expense
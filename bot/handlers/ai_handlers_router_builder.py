@@ -16,10 +16,6 @@ from resources.ai.providers import AIModel
 from resources.ai.prompt_templates import (
     PromptTemplateExpenseFromFreeInput
 )
-from database.models import (
-    UsersProperties,
-    Properties
-)
 from handlers.abstract_router_builder import AbstractRouterBuilder
 from logger import Logger
 
@@ -52,11 +48,7 @@ class AIHandlersRouterBuilder(AbstractRouterBuilder):
         await bot.download_file(file_path, destination)
 
         try:
-            with self.db.get_session() as db:
-                users_comments = db.query(UsersProperties.property_value).filter(
-                    UsersProperties.properties.has(Properties.property_name == "comments"),
-                    UsersProperties.user_id == user_id
-                ).first()[0]
+            users_comments = await self.user_properties.get(user_id, "comments")
 
             ai_response = await GeminiAIProvider(AIModel.GEMINI_2_FLASH).ask_about_file(
                 destination,
@@ -83,11 +75,7 @@ class AIHandlersRouterBuilder(AbstractRouterBuilder):
             disable_notification=True
         )
 
-        with self.db.get_session() as db:
-            users_comments = db.query(UsersProperties.property_value).filter(
-                UsersProperties.properties.has(Properties.property_name == "comments"),
-                UsersProperties.user_id == user_id
-            ).first()[0]
+        users_comments = await self.user_properties.get(user_id, "comments")
 
         ai_response = await GeminiAIProvider(AIModel.GEMINI_2_FLASH).ask(
             PromptTemplateExpenseFromFreeInput({
@@ -7,6 +7,7 @@ from aiogram import (
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 
+from database.fsm_storage import flush_fsm_batch
 from handlers.abstract_router_builder import AbstractRouterBuilder
 from resources import interface_messages
 from logger import Logger
@@ -27,6 +28,7 @@ class BasicHandlersRouterBuilder(AbstractRouterBuilder):
     async def handler_health_check(self, message: types.Message, state: FSMContext):
         await message.delete()
         await state.set_state(self.state.shortcut)
+        await flush_fsm_batch()
         msg = await message.answer(text=interface_messages.HEALTH_CHECK,
                                    disable_notification=True)
         await asyncio.sleep(2)
@@ -1,18 +1,17 @@
 import asyncio
-import re
+from uuid import UUID
 
 from aiogram import types, Router, F, Bot
 from aiogram.filters import Command, or_f
 from aiogram.fsm.context import FSMContext
 from aiogram.exceptions import TelegramBadRequest
 from datetime import datetime as dt, timedelta as td
+from sqlalchemy import select
 
 from handlers.abstract_router_builder import AbstractRouterBuilder
 from database.models import (
     Expenses,
-    Users,
-    UsersProperties,
-    Properties
+    Users
 )
 from resources.keyboards import (
     build_date_keyboard,
@@ -23,6 +22,7 @@ from resources.keyboards import (
 )
 from resources import interface_messages
 from resources.expense_attributes import ExpenseAttribute
+from resources.callback_data import ExpenseCallback, unpack_expense_id
 from resources.editing_labels import EditingLabels
 from logger import Logger
 
@@ -65,7 +65,8 @@ class ExpenseHandlersRouterBuilder(AbstractRouterBuilder):
 
         # Editing / Deleting
         self.router.callback_query.register(self.handler_set_editing_state,
-                                            F.data.in_({"edit"}))
+                                            or_f(F.data.in_({"edit"}),
+                                                 ExpenseCallback.filter(F.action == "edit")))
         self.router.callback_query.register(self.handler_edit_date,
                                             self.state.edit_mode,
                                             F.data.in_({"edit_date"}))
@@ -83,7 +84,8 @@ class ExpenseHandlersRouterBuilder(AbstractRouterBuilder):
                                             F.data.in_({"back", "cancel_deletion"}))
 
         self.router.callback_query.register(self.handler_set_deleting_state,
-                                            F.data.in_({"delete"}))
+                                            or_f(F.data.in_({"delete"}),
+                                                 ExpenseCallback.filter(F.action == "delete")))
         self.router.callback_query.register(self.handler_delete_expense,
                                             F.data.in_({"confirm_deletion"}))
 
@@ -93,32 +95,28 @@ class ExpenseHandlersRouterBuilder(AbstractRouterBuilder):
         """
         **Step 0. Input point for commands 'add' and 'shortcut'**
         """
-        with self.db.get_session() as db:
-            user = db.query(Users).filter(Users.user_id == message.from_user.id).all()
-            if not user:
-                msg = await message.answer(interface_messages.ERROR_ADD_BEFORE_SETUP,
-                                           disable_notification=True)
-                await self.save_init_instruction_msg_id(msg, state)
-                await message.delete()
-                return
+        async with self.db.get_async_session() as db:
+            user = (await db.scalars(select(Users).filter(Users.user_id == message.from_user.id))).all()
+        if not user:
+            msg = await message.answer(interface_messages.ERROR_ADD_BEFORE_SETUP,
+                                       disable_notification=True)
+            await self.save_init_instruction_msg_id(msg, state)
+            await message.delete()
+            return
 
-            if message.text == "/shortcut":
-                shortcuts = db.query(UsersProperties.property_value) \
-                    .filter(UsersProperties.properties.has(
-                        Properties.property_name == "shortcuts"),
-                        UsersProperties.user_id == message.from_user.id
-                    ).all()
-                if not shortcuts:
-                    msg = await message.answer(interface_messages.WRONG_NO_SHORTCUTS,
-                                            disable_notification=True)
-                    await message.delete()
-                    await asyncio.sleep(2)
-                    await msg.delete()
-                    return
-                await state.set_state(self.state.shortcut)
-                await self.__route_user_by_state(message, state)
+        if message.text == "/shortcut":
+            shortcuts = await self.user_properties.get(message.from_user.id, "shortcuts")
+            if not shortcuts:
+                msg = await message.answer(interface_messages.WRONG_NO_SHORTCUTS,
+                                           disable_notification=True)
                 await message.delete()
+                await asyncio.sleep(2)
+                await msg.delete()
                 return
+            await state.set_state(self.state.shortcut)
+            await self.__route_user_by_state(message, state)
+            await message.delete()
+            return
 
         msg = await message.answer(interface_messages.ASK_EXPENSE_DATE,
                                    reply_markup=build_date_keyboard(),
@@ -259,20 +257,19 @@ class ExpenseHandlersRouterBuilder(AbstractRouterBuilder):
         """
         await self.delete_init_instruction(message.chat.id, state, bot)
         state_data = await state.get_data()
-        expense_data = {
+        expense_data = await state.update_data({
             "db_payload": {
                 **state_data.get("db_payload", {}),
                 "user_id": message.from_user.id,
-                "message": message,
                 "comment": message.text
             }
-        }
-        expense_data = await state.update_data(expense_data)
+        })
 
         if await state.get_state() == self.state.edit_comment:
             await self.__route_user_by_state(message, state)
         else:
-            await self.report_expense_details(expense_data["db_payload"])
+            # message is passed along, not kept in FSM
+            await self.report_expense_details({**expense_data["db_payload"], "message": message})
 
         await message.delete()
         await state.clear()
@@ -297,9 +294,17 @@ class ExpenseHandlersRouterBuilder(AbstractRouterBuilder):
         await self.delete_init_instruction(callback.message.chat.id, state, bot)
         await state.clear()
 
-    async def handler_set_editing_state(self, callback: types.CallbackQuery, state: FSMContext):
+    async def handler_set_editing_state(self,
+                                        callback: types.CallbackQuery,
+                                        state: FSMContext,
+                                        callback_data: ExpenseCallback | None = None):
+        expense = await self.get_expense_under_edit(callback.message,
+                                                    unpack_expense_id(callback_data.ref) if callback_data else None)
+        if expense is None:
+            await callback.answer(interface_messages.EXPENSE_NOT_SAVED, show_alert=True)
+            return
         await callback.message.edit_reply_markup(str(callback.message.message_id), build_edit_mode_keyboard())
-        await state.update_data({"msg_under_edit": callback.message})
+        await state.update_data({"expense_under_edit": expense})
         await state.set_state(self.state.edit_mode)
 
     async def handler_edit_date(self, callback: types.CallbackQuery, state: FSMContext):
@@ -331,7 +336,7 @@ class ExpenseHandlersRouterBuilder(AbstractRouterBuilder):
         })
         await state.set_state(self.state.edit_amount)
 
-        category = re.search(r'(?<=Category: ).*$', callback.message.text, flags=re.M).group(0)
+        category = (await state.get_data())["expense_under_edit"]["category"]
         msg = await self.__ask_for_expense_amount(callback.message, state, callback.message.chat.id, category)
         await self.save_init_instruction_msg_id(msg, state)
 
@@ -342,28 +347,39 @@ class ExpenseHandlersRouterBuilder(AbstractRouterBuilder):
 
         await state.set_state(self.state.edit_comment)
 
-        category = re.search(r'(?<=Category: ).*$', callback.message.text, flags=re.M).group(0)
+        category = (await state.get_data())["expense_under_edit"]["category"]
         msg = await self.__ask_for_expense_comment(callback.message, state, callback.message.chat.id, category)
         await self.save_init_instruction_msg_id(msg, state)
 
-    async def handler_set_deleting_state(self, callback: types.CallbackQuery, state: FSMContext):
+    async def handler_set_deleting_state(self,
+                                         callback: types.CallbackQuery,
+                                         state: FSMContext,
+                                         callback_data: ExpenseCallback | None = None):
+        expense = await self.get_expense_under_edit(callback.message,
+                                                    unpack_expense_id(callback_data.ref) if callback_data else None)
+        if expense is None:
+            await callback.answer(interface_messages.EXPENSE_NOT_SAVED, show_alert=True)
+            return
         await callback.message.edit_reply_markup(str(callback.message.message_id), build_listlike_keyboard(
             ["confirm_deletion", "cancel_deletion"], title_button_names=True
         ))
-        await state.update_data({"msg_under_edit": callback.message})
+        await state.update_data({"expense_under_edit": expense})
         await state.set_state(self.state.delete_mode)
 
-    async def handler_delete_expense(self, callback: types.CallbackQuery, state: FSMContext):
-        is_success = await self.__delete_expense(state)
+    async def handler_delete_expense(self, callback: types.CallbackQuery, state: FSMContext, bot: Bot):
+        is_success = await self.__delete_expense(state, bot)
         if is_success:
             await callback.message.delete()
 
     async def handler_back_to_main(self, callback: types.CallbackQuery, state: FSMContext, bot: Bot):
         await self.delete_init_instruction(callback.message.chat.id, state, bot)
+        expense = (await state.get_data()).get("expense_under_edit")
         await state.clear()
         try:
             await callback.message.edit_reply_markup(str(callback.message.message_id),
-                                                     build_edit_mode_main_keyboard())
+                                                     build_edit_mode_main_keyboard(
+                                                         expense["expense_id"] if expense else None
+                                                     ))
         except TelegramBadRequest:
             pass
 
@@ -383,7 +399,7 @@ class ExpenseHandlersRouterBuilder(AbstractRouterBuilder):
             case self.state.edit_date | self.state.edit_category \
                  | self.state.edit_amount | self.state.edit_comment:
                 s = await state.get_data()
-                await self.edit_expense_attribute(state, s.get("editing_attribute"))
+                await self.edit_expense_attribute(state, s.get("editing_attribute"), message.bot)
                 return
             case _:
                 reply_msg = interface_messages.ASK_EXPENSE_CATEGORY
@@ -440,39 +456,28 @@ class ExpenseHandlersRouterBuilder(AbstractRouterBuilder):
         return msg
 
     async def __delete_expense(self,
-                               state: FSMContext) -> str:
-        editing_label = EditingLabels.DELETION_FAILED.value
+                               state: FSMContext,
+                               bot: Bot) -> str:
         s = await state.get_data()
-        msg: types.Message = s.get("msg_under_edit")
-        edited_text = msg.text
+        expense = s.get("expense_under_edit")
         try:
-            with self.db.get_session() as db:
-                expense_id = db.query(Expenses.expense_id).filter(
-                    Expenses.user_id == msg.chat.id,
-                    Expenses.message_id == msg.message_id
-                ).first()[0]
-                db.delete(db.query(Expenses).get(expense_id))
-                db.commit()
+            async with self.db.get_async_session() as db:
+                await db.delete(await db.get(Expenses, UUID(expense["expense_id"])))
+                await db.commit()
             return "success"
         except Exception as e:
-            self.logger.log("__delete_expense", msg.from_user.id, str(e), "error")
-            await msg.edit_text(
-                text=(edited_text + f"\n{editing_label}"
-                      if not any(msg.text.endswith(x.value) for x in EditingLabels)
-                      else edited_text
-                      .replace(EditingLabels.EDITED.value, editing_label)
-                      .replace(EditingLabels.EDIT_FAILED.value, editing_label)
-                      .replace(EditingLabels.DELETION_FAILED.value, editing_label)),
-                inline_message_id=str(msg.message_id),
-                reply_markup=build_edit_mode_main_keyboard()
+            self.logger.log("__delete_expense", expense["chat_id"], str(e), "error")
+            await bot.edit_message_text(
+                text=interface_messages.SUCCESS_RECORD + self.format_expense_details(expense)
+                     + f"\n{EditingLabels.DELETION_FAILED.value}",
+                chat_id=expense["chat_id"],
+                message_id=expense["message_id"],
+                parse_mode="Markdown",
+                reply_markup=build_edit_mode_main_keyboard(expense["expense_id"])
             )
 
     async def __get_user_property(self, user_id: int, property_name: str, category_name: str = None):
-        with self.db.get_session() as db:
-            property_value = db.query(UsersProperties.property_value).filter(
-                UsersProperties.properties.has(Properties.property_name == property_name),
-                UsersProperties.user_id == user_id
-            ).first()[0]
-            if category_name:
-                return property_value.get(category_name, property_value["default"])
-            return property_value
+        property_value = await self.user_properties.get(user_id, property_name)
+        if category_name:
+            return property_value.get(category_name, property_value["default"])
+        return property_value
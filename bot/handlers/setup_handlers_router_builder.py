@@ -9,9 +9,16 @@ from aiogram import (
 )
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from handlers.abstract_router_builder import AbstractRouterBuilder
+from resources.reference_data import ReferenceData
+from resources.default_user_properties import (
+    DEFAULT_USER_PROPERTIES,
+    upsert_users,
+    upsert_default_properties
+)
 from resources import (
     interface_messages,
     keyboards,
@@ -20,8 +27,6 @@ from resources import (
 from database.models import (
     Users,
     UsersProperties,
-    Properties,
-    Categories,
 )
 from logger import Logger
 
@@ -82,20 +87,19 @@ class SetupHandlersRouterBuilder(AbstractRouterBuilder):
         user_id = message.from_user.id
         command = message.text[1:]
         await message.delete()
-        with self.db.get_session() as db:
-            self.__create_user(db, user_id)
+        async with self.db.get_async_session() as db:
+            await upsert_users(db, [user_id])
             if command == "start":
-                properties_to_set = self.__get_properties_to_setup(db, user_id)
+                # values user already has are kept
+                properties_to_set = await self.reference_data.get_required_property_names()
                 override = False
             else:
-                properties_to_set = ["categories",
-                                     "base_currency",
-                                     "amounts",
-                                     "comments"]
+                properties_to_set = list(DEFAULT_USER_PROPERTIES)
                 override = True
 
-            self.__setup_default_properties(db, properties_to_set, user_id, override)
-            db.commit()
+            await upsert_default_properties(db, [user_id], properties_to_set, override)
+            await db.commit()
+        self.user_properties.invalidate(user_id)
 
         if inform:
             information_text = interface_messages.DEFAULT_SETUP_SUCCESSFUL \
@@ -104,11 +108,11 @@ class SetupHandlersRouterBuilder(AbstractRouterBuilder):
                                        disable_notification=True)
 
     async def handler_display_settings_menu(self, message: types.Message, state: FSMContext):
-        with self.db.get_session() as db:
-            user = db.query(Users).filter(Users.user_id == message.from_user.id).all()
-            if not user:
-                await self.handler_setup_init(message, inform=False)
-            props = [p[0] for p in db.query(Properties.property_name).all()]
+        async with self.db.get_async_session() as db:
+            user = (await db.scalars(select(Users).filter(Users.user_id == message.from_user.id))).all()
+        if not user:
+            await self.handler_setup_init(message, inform=False)
+        props = await self.reference_data.get_property_names()
 
         msg = await message.answer(interface_messages.SETTINGS_START,
                                    reply_markup=keyboards.build_listlike_keyboard(props),
@@ -117,8 +121,7 @@ class SetupHandlersRouterBuilder(AbstractRouterBuilder):
         await message.delete()
 
     async def handler_choose_base_currency(self, callback: types.CallbackQuery, state: FSMContext):
-        with self.db.get_session() as db:
-            current_base_currency = await self.get_base_currency(callback.from_user.id)
+        current_base_currency = await self.get_base_currency(callback.from_user.id)
 
         available_for_choosing = filter(
             lambda x: x != current_base_currency,
@@ -135,28 +138,21 @@ class SetupHandlersRouterBuilder(AbstractRouterBuilder):
         await self.save_init_instruction_msg_id(msg, state)
 
     async def handler_set_base_currency(self, callback: types.CallbackQuery, state: FSMContext):
-        with self.db.get_session() as db:
-            self.__setup_default_property(db_session=db,
-                                          user_id=callback.from_user.id,
-                                          property_name="base_currency",
-                                          property_value={"base_currency": callback.data},
-                                          is_update=True)
-            db.commit()
+        async with self.db.get_async_session() as db:
+            await self.__update_user_property(db_session=db,
+                                              user_id=callback.from_user.id,
+                                              property_name="base_currency",
+                                              property_value={"base_currency": callback.data})
+            await db.commit()
+        self.user_properties.invalidate(callback.from_user.id)
 
         await callback.answer(interface_messages.SETTINGS_SET_SUCCESS,
                                     disable_notification=True)
         await callback.message.delete()
 
     async def handler_set_categories(self, callback: types.CallbackQuery, state: FSMContext):
-        with self.db.get_session() as db:
-            chosen_categories = db.query(UsersProperties.property_value) \
-                .filter(UsersProperties.properties.has(
-                    Properties.property_name == "categories"
-                ),
-                UsersProperties.user_id == callback.from_user.id
-            ).first()[0]
-            categories = db.query(Categories.category_name).all()
-            categories = [x[0] for x in categories]
+        chosen_categories = await self.user_properties.get(callback.from_user.id, "categories")
+        categories = await self.reference_data.get_category_names()
         categories_map = {category: category in chosen_categories for category in categories}
         await state.update_data({"categories_setting": categories_map})
         msg = await callback.message.reply("Pick categories you would like to see while adding new expense:",
@@ -178,15 +174,14 @@ class SetupHandlersRouterBuilder(AbstractRouterBuilder):
                 disable_notification=True)
             return
 
-        with self.db.get_session() as db:
-            categories_prop = db.query(Properties) \
-                .filter(Properties.property_name == "categories").first()
-            db.bulk_update_mappings(UsersProperties, [{
+        async with self.db.get_async_session() as db:
+            await db.execute(update(UsersProperties), [{
                 "user_id": callback.from_user.id,
-                "property_id": categories_prop.property_id,
+                "property_id": await self.reference_data.get_property_id("categories"),
                 "property_value": [cat for cat, is_active in categories_map.items() if is_active]
             }])
-            db.commit()
+            await db.commit()
+        self.user_properties.invalidate(callback.from_user.id)
         await callback.answer("✅ Categories set successfully!",
                               disable_notification=True)
         await self.delete_init_instruction(callback.from_user.id, state, bot)
@@ -194,18 +189,10 @@ class SetupHandlersRouterBuilder(AbstractRouterBuilder):
 
     async def handler_choose_category(self, callback: types.CallbackQuery, state: FSMContext):
         await state.update_data({"setting_property": callback.data})
-        with self.db.get_session() as db:
-            categories = db.query(UsersProperties.property_value) \
-                .filter(
-                    UsersProperties.properties.has(
-                        Properties.property_name == "categories"
-                    ),
-                    UsersProperties.user_id == callback.from_user.id
-                ) \
-                .first()
+        categories = await self.user_properties.get(callback.from_user.id, "categories")
         msg = await callback.message.reply(interface_messages.SETTINGS_CATEGORIES_CHOICE,
                                            reply_markup=keyboards.build_listlike_keyboard(
-                                               categories[0], additional_items=["default"]
+                                               categories, additional_items=["default"]
                                            ),
                                            disable_notification=True)
         await callback.message.delete()
@@ -214,14 +201,9 @@ class SetupHandlersRouterBuilder(AbstractRouterBuilder):
 
     async def handler_request_values_for_category(self, callback: types.CallbackQuery, state: FSMContext):
         state_data = await state.get_data()
-        with self.db.get_session() as db:
-            current_value = db.query(UsersProperties.property_value) \
-                .filter(UsersProperties.properties.has(
-                    Properties.property_name == state_data["setting_property"]
-                ),
-                UsersProperties.user_id == callback.from_user.id
-            ).first()[0].get(callback.data, ["no values set"])
-            current_value = [self.__escape_markdown(str(x), 2) for x in current_value]
+        current_value = (await self.user_properties.get(callback.from_user.id, state_data["setting_property"])) \
+            .get(callback.data, ["no values set"])
+        current_value = [self.__escape_markdown(str(x), 2) for x in current_value]
         await state.update_data({"setting_property_category": callback.data})
 
         msg = await callback.message.reply(f"Current values: `{', '.join(current_value)}`\n\n" +
@@ -249,14 +231,14 @@ class SetupHandlersRouterBuilder(AbstractRouterBuilder):
             case _:
                 pass
 
-        with self.db.get_session() as db:
-            self.__setup_default_property(db_session=db,
-                                          user_id=message.from_user.id,
-                                          property_name=state_data["setting_property"],
-                                          property_value=new_values,
-                                          category=state_data["setting_property_category"],
-                                          is_update=True)
-            db.commit()
+        async with self.db.get_async_session() as db:
+            await self.__update_user_property(db_session=db,
+                                              user_id=message.from_user.id,
+                                              property_name=state_data["setting_property"],
+                                              property_value=new_values,
+                                              category=state_data["setting_property_category"])
+            await db.commit()
+        self.user_properties.invalidate(message.from_user.id)
 
         msg = await message.answer(interface_messages.SETTINGS_SET_SUCCESS,
                                    disable_notification=True)
@@ -314,9 +296,8 @@ class SetupHandlersRouterBuilder(AbstractRouterBuilder):
 
     async def handler_ask_shortcut_category(self, callback: types.CallbackQuery, state: FSMContext):
         await callback.answer()
-        with self.db.get_session() as db:
-            reply_msg = interface_messages.ASK_EXPENSE_CATEGORY
-            keyboard_layout = [x[0] for x in db.query(Categories.category_name).all()]
+        reply_msg = interface_messages.ASK_EXPENSE_CATEGORY
+        keyboard_layout = await self.reference_data.get_category_names()
         msg = await callback.message.reply(reply_msg,
                                            reply_markup=keyboards.build_listlike_keyboard(
                                                entities=keyboard_layout,
@@ -369,13 +350,14 @@ class SetupHandlersRouterBuilder(AbstractRouterBuilder):
         await self.delete_init_instruction(message.chat.id, state, bot)
         cur_state_data = await state.get_data()
 
-        with self.db.get_session() as db:
+        async with self.db.get_async_session() as db:
             filters = [
-                    UsersProperties.properties.has(Properties.property_name == "shortcuts"),
+                    UsersProperties.property_id == await self.reference_data.get_property_id("shortcuts"),
                     UsersProperties.user_id == message.from_user.id
                 ]
-            cur_prop_value = db.query(UsersProperties.property_value) \
-                .filter(*filters).first()
+            cur_prop_value = (await db.execute(
+                select(UsersProperties.property_value).filter(*filters)
+            )).first()
             if cur_prop_value:
                 cur_prop_value = cur_prop_value[0]
             else:
@@ -383,9 +365,7 @@ class SetupHandlersRouterBuilder(AbstractRouterBuilder):
                 is_first_shortcut = True
             cur_prop_value[message.text] = cur_state_data["shortcut_payload"]
 
-            prop_id = db.query(Properties.property_id).filter(
-                Properties.property_name == "shortcuts"
-            ).first()[0]
+            prop_id = await self.reference_data.get_property_id("shortcuts")
             property_payload = {
                 "user_id": message.from_user.id,
                 "property_id": prop_id,
@@ -395,8 +375,9 @@ class SetupHandlersRouterBuilder(AbstractRouterBuilder):
             if is_first_shortcut:
                 db.add(UsersProperties(**property_payload))
             else:
-                db.bulk_update_mappings(UsersProperties, [property_payload])
-            db.commit()
+                await db.execute(update(UsersProperties), [property_payload])
+            await db.commit()
+        self.user_properties.invalidate(message.from_user.id)
         msg = await message.answer(interface_messages.SETTINGS_SET_SUCCESS,
                                    disable_notification=True)
         await message.delete()
@@ -404,45 +385,39 @@ class SetupHandlersRouterBuilder(AbstractRouterBuilder):
         await msg.delete()
 
     async def handler_ask_shortcut_to_delete(self, callback: types.CallbackQuery, state: FSMContext):
-        with self.db.get_session() as db:
-            filters = [
-                    UsersProperties.properties.has(Properties.property_name == "shortcuts"),
-                    UsersProperties.user_id == callback.message.chat.id
-                ]
-            cur_shortcuts = db.query(UsersProperties.property_value) \
-                .filter(*filters).first()
-            if not cur_shortcuts:
-                await callback.answer("⚠️No shortcuts to delete.")
-                await callback.message.delete()
-                return
+        cur_shortcuts = await self.user_properties.get(callback.message.chat.id, "shortcuts")
+        if not cur_shortcuts:
+            await callback.answer("⚠️No shortcuts to delete.")
+            await callback.message.delete()
+            return
         await callback.message.reply(text="Which shortcut to delete?",
                                      reply_markup=keyboards.build_listlike_keyboard(
-                                         entities=cur_shortcuts[0].keys(),
+                                         entities=cur_shortcuts.keys(),
                                          max_items_in_a_row=3
                                      ))
         await state.set_state(self.state.settings_delete_shortcut)
         await callback.message.delete()
 
     async def handler_delete_shortcut(self, callback: types.CallbackQuery, state: FSMContext):
-        with self.db.get_session() as db:
+        async with self.db.get_async_session() as db:
             filters = [
-                    UsersProperties.properties.has(Properties.property_name == "shortcuts"),
+                    UsersProperties.property_id == await self.reference_data.get_property_id("shortcuts"),
                     UsersProperties.user_id == callback.message.chat.id
                 ]
-            cur_shortcuts = db.query(UsersProperties.property_value) \
-                .filter(*filters).first()[0]
+            cur_shortcuts = (await db.execute(
+                select(UsersProperties.property_value).filter(*filters)
+            )).first()[0]
             cur_shortcuts.pop(callback.data)
 
-            prop_id = db.query(Properties.property_id).filter(
-                Properties.property_name == "shortcuts"
-            ).first()[0]
+            prop_id = await self.reference_data.get_property_id("shortcuts")
             property_payload = {
                 "user_id": callback.message.chat.id,
                 "property_id": prop_id,
                 "property_value": cur_shortcuts
             }
-            db.bulk_update_mappings(UsersProperties, [property_payload])
-            db.commit()
+            await db.execute(update(UsersProperties), [property_payload])
+            await db.commit()
+        self.user_properties.invalidate(callback.message.chat.id)
         await callback.answer(f"✅ Shortcut '{callback.data}' deleted")
         await callback.message.delete()
         await state.clear()
@@ -455,88 +430,31 @@ class SetupHandlersRouterBuilder(AbstractRouterBuilder):
         await msg.delete()
 
     @staticmethod
-    def __create_user(db_session: Session, user_id: int):
-        user = db_session.query(Users).filter(Users.user_id == user_id).all()
-        if not user:
-            db_session.add(Users(
-                user_id=user_id,
-                user_role="viewer"
-            ))
-
-    @staticmethod
-    def __get_properties_to_setup(db_session: Session, user_id: int) -> list[str]:
-        existing_props = db_session.query(UsersProperties.property_id) \
-            .filter(UsersProperties.user_id == user_id).all()
-        existing_props = [x[0] for x in existing_props]
-        filters = [Properties.is_required == True]
-        if existing_props:
-            filters.append(Properties.property_id.notin_(existing_props))
-        props = db_session.query(Properties.property_name).filter(*filters).all()
-        print(props)
-        return [x[0] for x in props]
-
-    def __setup_default_properties(self,
-                                   db_session: Session,
-                                   properties_to_set: list[str],
-                                   user_id: int,
-                                   is_update: bool = False):
-        for prop in properties_to_set:
-            match prop:
-                case "categories":
-                    self.__setup_default_property(db_session, user_id, prop, [
-                        "Fun", "Clothes", "Transportation", "Eat outside",
-                        "Food", "Facilities", "Medicine", "Home", "Other", "Rent"
-                    ], is_update=is_update)
-                case "base_currency":
-                    self.__setup_default_property(db_session, user_id, prop, {
-                        prop: "USD"
-                    }, is_update=is_update)
-                case "amounts":
-                    self.__setup_default_property(db_session, user_id, prop, {
-                        "default": [1, 3, 5, 7, 10, 15, 25, 30],
-                        "Transportation": [5, 15, 20, 30, 50],
-                        "Eat outside": [10, 15, 20, 25, 30, 40, 50, 60]
-                    }, is_update=is_update)
-                case "comments":
-                    self.__setup_default_property(db_session, user_id, prop, {
-                        "default": ["Groceries", "Weekly groceries", "Cafe", "Restaurant",
-                                    "MyFavoriteDoner", "Taxi", "Public transport", "Water",
-                                    "Electricity", "Heating", "Internet"]
-                    }, is_update=is_update)
-                case _:
-                    pass
-
-    @staticmethod
-    def __setup_default_property(db_session: Session,
-                                 user_id: int,
-                                 property_name: str,
-                                 property_value: dict | list | None,
-                                 category: str | None = None,
-                                 is_update: bool = False):
-        categories_prop = db_session.query(Properties) \
-            .filter(Properties.property_name == property_name).first()
-        if is_update:
-            if category:
-                filters = [
-                    UsersProperties.properties.has(Properties.property_name == property_name),
-                    UsersProperties.user_id == user_id
-                ]
-                current_prop_value = db_session.query(UsersProperties.property_value) \
-                    .filter(*filters).first()[0]
-                current_prop_value[category] = property_value
-                property_value = current_prop_value
-            db_session.bulk_update_mappings(UsersProperties, [{
-                "user_id": user_id,
-                "property_id": categories_prop.property_id,
-                "property_value": property_value
-            }])
-            db_session.commit()
-        else:
-            db_session.add(UsersProperties(
-                property_id=categories_prop.property_id,
-                user_id=user_id,
-                property_value=property_value
-            ))
+    async def __update_user_property(db_session: AsyncSession,
+                                     user_id: int,
+                                     property_name: str,
+                                     property_value: dict | list | None,
+                                     category: str | None = None):
+        """
+        Properties are provisioned by `upsert_default_properties`, here only existing ones are changed.
+        The caller commits and invalidates cached properties of the user.
+        """
+        property_id = await ReferenceData.get_shared().get_property_id(property_name)
+        if category:
+            filters = [
+                UsersProperties.property_id == property_id,
+                UsersProperties.user_id == user_id
+            ]
+            current_prop_value = (await db_session.execute(
+                select(UsersProperties.property_value).filter(*filters)
+            )).first()[0]
+            current_prop_value[category] = property_value
+            property_value = current_prop_value
+        await db_session.execute(update(UsersProperties), [{
+            "user_id": user_id,
+            "property_id": property_id,
+            "property_value": property_value
+        }])
 
     @staticmethod
     def __escape_markdown(text: str, version: int = 1, entity_type: str = None) -> str:
@@ -0,0 +1,2 @@
+from middlewares.database_session_middleware import DatabaseSessionMiddleware
+from middlewares.fsm_batch_middleware import FsmBatchMiddleware
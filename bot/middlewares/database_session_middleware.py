@@ -0,0 +1,32 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from database.database import DatabaseFacade
+from logger import Logger
+
+
+class DatabaseSessionMiddleware(BaseMiddleware):
+    """
+    Gives every update its own session from the pooled engine, it is closed when the update is handled.
+    The session is also passed to handlers as `db_session`. It holds a pooled connection only while
+    a `get_async_session` block is open, see `DatabaseFacade.get_async_session`.
+    """
+
+    def __init__(self, db: DatabaseFacade, logger: Logger):
+        self.db = db
+        self.logger = logger
+
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject,
+                       data: Dict[str, Any]) -> Any:
+        async with self.db.session_scope() as session:
+            data["db_session"] = session
+            result = await handler(event, data)
+
+        pool_stats = self.db.get_pool_stats()
+        if pool_stats["overflow"] > 0:
+            self.logger.log(self, extra_text=f"DB pool is in overflow: {pool_stats}", level="warn")
+        return result
@@ -0,0 +1,31 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject
+
+from database.fsm_storage import PostgresStorage
+
+
+class FsmBatchMiddleware(BaseMiddleware):
+    """
+    Batches FSM storage of one update: state and data are read once per key however many times handlers ask,
+    and changes are written once when the update is handled.
+    It has to wrap aiogram `FSMContextMiddleware`, which reads the state before handlers run, see `setup()`.
+    """
+
+    def __init__(self, storage: PostgresStorage):
+        self.storage = storage
+
+    @staticmethod
+    def setup(dispatcher: Dispatcher, storage: PostgresStorage):
+        """Registers the middleware right before FSM context middleware of the dispatcher."""
+        dispatcher.update.outer_middleware.unregister(dispatcher.fsm)
+        dispatcher.update.outer_middleware(FsmBatchMiddleware(storage))
+        dispatcher.update.outer_middleware(dispatcher.fsm)
+
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject,
+                       data: Dict[str, Any]) -> Any:
+        async with self.storage.batch():
+            return await handler(event, data)
@@ -10,67 +10,59 @@ WITH base_currency AS (
         AND up.user_id = {{user_id}}
 )
 
-, base_expenses AS (
+-- weekly_category_totals is kept up to date by a trigger on expenses, a few rows per user and week are read
+, weekly_totals AS (
     SELECT
-        e.id AS expense_id,
-        c.name AS category_name,
-        e.spent_on,
-        COALESCE(
+        w.week_start,
+        COALESCE(c.name, 'TOTAL') AS category_name,
+        SUM(COALESCE(
             CASE
-                WHEN e.currency = bc.base_currency THEN e.amount
-                ELSE e.amount /
-                    nullif(((e.rates->>'rates')::json->>e.currency)::float, 0) * -- convert to base_currency (BC) from column rates
-                    nullif(((e.rates->>'rates')::json->>bc.base_currency)::float, 0) -- convert to latest BC (mostly multiplies on 1, but crucial if BC on expense date differs from latest)
+                WHEN w.base_currency = bc.base_currency THEN w.amount
+                ELSE w.amount /
+                    nullif((cr.rates->>w.base_currency)::float, 0) * -- convert with latest rates table of the week
+                    nullif((cr.rates->>bc.base_currency)::float, 0) -- only when BC of expenses differs from latest BC
             END,
-            e.amount)::decimal(15,2) AS amount_in_base_currency,
-        bc.base_currency AS base_currency
-    FROM expense_bot.expenses e
-    LEFT JOIN expense_bot.categories c ON e.category_id = c.id
-    LEFT JOIN base_currency bc ON e.user_id = bc.user_id
+            w.amount)::decimal(15,2)) AS sum_amount
+    FROM expense_bot.weekly_category_totals w
+    JOIN expense_bot.categories c ON w.category_id = c.id
+    CROSS JOIN base_currency bc
+    -- saved expenses keep pivot tables only, a table is skipped unless it has both currencies
+    LEFT JOIN LATERAL (
+        SELECT rates
+        FROM expense_bot.currency_rates
+        WHERE
+            w.base_currency <> bc.base_currency
+            AND base = '{{pivot_currency}}'
+            AND rate_date <= w.week_start + 6
+            AND (rates->>w.base_currency)::float > 0
+            AND (rates->>bc.base_currency)::float > 0
+        ORDER BY rate_date DESC
+        LIMIT 1
+    ) cr ON TRUE
     WHERE
-        e.user_id = {{user_id}}
-        AND e.spent_on BETWEEN DATE_TRUNC('week', CURRENT_DATE) - INTERVAL '28 days' AND CURRENT_DATE
+        w.user_id = {{user_id}}
+        AND w.week_start IN (
+            DATE_TRUNC('week', CURRENT_DATE)::date,
+            DATE_TRUNC('week', CURRENT_DATE)::date - 7,
+            DATE_TRUNC('week', CURRENT_DATE)::date - 28
+        )
         AND c.name NOT IN ('Rent')
-    ORDER BY e.spent_on DESC, e.created_at DESC
-)
-
-, expenses_by_week AS (
-    SELECT
-        TO_CHAR(spent_on, 'YYYYIW') AS week,
-        COALESCE(category_name, 'TOTAL') AS category_name,
-        SUM(amount_in_base_currency) AS sum_amount,
-        MAX(base_currency) AS base_currency
-    FROM base_expenses e
     GROUP BY GROUPING SETS
-        (TO_CHAR(spent_on, 'YYYYIW'), category_name),
-        (TO_CHAR(spent_on, 'YYYYIW'))
-)
-
-, weeks_and_categories AS (
-    SELECT
-        DISTINCT w.week, c.name
-    FROM expenses_by_week w
-    CROSS JOIN expense_bot.categories c
-    
-    UNION ALL
-
-    SELECT
-        DISTINCT w.week, 'TOTAL'
-    FROM expenses_by_week w
+        ((w.week_start, c.name), (w.week_start))
 )
 
 , prev_amounts AS (
     SELECT
-        wc.week,
-        wc.name,
+        TO_CHAR(DATE_TRUNC('week', CURRENT_DATE), 'IYYYIW') AS week,
+        wt.category_name AS name,
         bc.base_currency,
-        COALESCE(e.sum_amount, 0) AS sum_amount,
-        COALESCE(LAG(e.sum_amount, 1) OVER(PARTITION BY wc.name ORDER BY wc.week), 0) AS prev_week_sum_amount,
-        COALESCE(LAG(e.sum_amount, 4) OVER(PARTITION BY wc.name ORDER BY wc.week), 0) AS prev_month_week_sum_amount
-    FROM weeks_and_categories wc
-    LEFT JOIN expenses_by_week e ON wc.week = e.week AND wc.name = e.category_name
+        COALESCE(SUM(wt.sum_amount) FILTER (WHERE wt.week_start = DATE_TRUNC('week', CURRENT_DATE)::date), 0) AS sum_amount,
+        COALESCE(SUM(wt.sum_amount) FILTER (WHERE wt.week_start = DATE_TRUNC('week', CURRENT_DATE)::date - 7), 0) AS prev_week_sum_amount,
+        COALESCE(SUM(wt.sum_amount) FILTER (WHERE wt.week_start = DATE_TRUNC('week', CURRENT_DATE)::date - 28), 0) AS prev_month_week_sum_amount
+    FROM weekly_totals wt
     CROSS JOIN base_currency bc
-    ORDER BY 2, 1
+    WHERE EXISTS (SELECT 1 FROM weekly_totals WHERE week_start = DATE_TRUNC('week', CURRENT_DATE)::date)
+    GROUP BY wt.category_name, bc.base_currency
 )
 
 SELECT
@@ -93,7 +85,6 @@ SELECT
     END AS diff_prev_month_week_pct
 FROM prev_amounts pa
 WHERE
-    week = TO_CHAR(CURRENT_DATE, 'YYYYIW')
-    AND NOT (prev_week_sum_amount = 0 AND sum_amount = 0)
+    NOT (prev_week_sum_amount = 0 AND sum_amount = 0)
 ORDER BY pa.sum_amount DESC
 """
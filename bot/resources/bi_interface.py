@@ -171,9 +171,24 @@ class SuperSetInterface(GenericBIInterface):
             raise ConnectionError(f"Get CSRF token failed: {response.text}")
         return response.json()["result"]
 
+    async def __get_rollup_dataset_id(self) -> int | None:
+        """Id of the weekly_category_totals dataset, None when it is not registered in Superset"""
+        return await self.__get_internal_entity_id_by_name("dataset", {
+            "col": "table_name",
+            "opr": "eq",
+            "value": "weekly_category_totals"
+        })
+
     async def __get_viewer_permission_ids(self):
+        permission_scope_list = list(self.default_viewer_permission_scope)
+        rollup_dataset_id = await self.__get_rollup_dataset_id()
+        if rollup_dataset_id:
+            permission_scope_list.append({
+                "permission_name": "datasource_access",
+                "view_menu_name": f"[ExpenseBot].[weekly_category_totals](id:{rollup_dataset_id})"
+            })
         permission_ids_coroutines = []
-        for permission_scope in self.default_viewer_permission_scope:
+        for permission_scope in permission_scope_list:
             permission_id_coroutine = self.__get_permission_resource_id(
                 permission_scope["permission_name"],
                 permission_scope["view_menu_name"]
@@ -218,7 +233,8 @@ class SuperSetInterface(GenericBIInterface):
                                                entity_type: str,
                                                *filters: dict[str, str | int]):
         """
-        :param entity_type: Could be 'permissions', 'resources' or 'permissions-resources'
+        :param entity_type: Could be 'permissions', 'resources', 'permissions-resources',
+            'rowlevelsecurity' or 'dataset'
         :param filters: Each filter has the following structure {
             "col": "col_name",
             "opr": "operator_string", # most frequent "eq", "rel_o_m"
@@ -236,7 +252,7 @@ class SuperSetInterface(GenericBIInterface):
 
         response = self.session.get(
             url=(f"{self.base_url}/"
-                 f"{'security/' if not entity_type == 'rowlevelsecurity' else ''}"
+                 f"{'security/' if entity_type not in ('rowlevelsecurity', 'dataset') else ''}"
                  f"{entity_type}/"),
             headers=headers,
             params=params
@@ -317,6 +333,10 @@ class SuperSetInterface(GenericBIInterface):
         return response.json()["id"], security_role, random_pass
 
     async def __create_rls_policy(self, user_id: int, role_id: int):
+        tables = [1]
+        rollup_dataset_id = await self.__get_rollup_dataset_id()
+        if rollup_dataset_id:
+            tables.append(rollup_dataset_id)
         data = json.dumps({
           "clause": f"user_id={user_id}",
           "filter_type": "Regular",
@@ -324,9 +344,7 @@ class SuperSetInterface(GenericBIInterface):
           "roles": [
             role_id
           ],
-          "tables": [
-            1
-          ]
+          "tables": tables
         })
         headers = {
             "accept": "application/json",
@@ -0,0 +1,22 @@
+import base64
+from uuid import UUID
+
+from aiogram.filters.callback_data import CallbackData
+
+
+class ExpenseCallback(CallbackData, prefix="exp"):
+    """
+    Edit mode action on an expense, the expense is referenced by its packed id,
+    e.g. `exp:edit:Ev1oU1aUQxqPLzZgI2O4Jg` - 31 bytes of 64 allowed by Telegram.
+    """
+    action: str
+    ref: str
+
+
+def pack_expense_id(expense_id: UUID | str) -> str:
+    expense_id = expense_id if isinstance(expense_id, UUID) else UUID(expense_id)
+    return base64.urlsafe_b64encode(expense_id.bytes).rstrip(b"=").decode()
+
+
+def unpack_expense_id(ref: str) -> UUID:
+    return UUID(bytes=base64.urlsafe_b64decode(ref + "=="))
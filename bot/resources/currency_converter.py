@@ -0,0 +1,78 @@
+from datetime import date, datetime as dt
+
+import numpy as np
+
+from resources.rate_history_store import RateHistoryStore
+
+
+class RateMatrix:
+    """
+    Rates of currencies per pivot currency as a (day x currency) float64 array starting at `first_date`.
+    Zero marks an unknown rate, the same way zero-filled tables do.
+    """
+
+    def __init__(self, currencies: list[str], rates: np.ndarray, first_date: date):
+        self.currencies = np.array(currencies)
+        self.rates = rates
+        self.first_ordinal = first_date.toordinal()
+        self._order = np.argsort(self.currencies)
+
+    @staticmethod
+    def from_tables(tables: dict[date, dict[str, float]], currencies: list[str]) -> "RateMatrix":
+        first_date = min(tables)
+        rates = np.zeros((max(tables).toordinal() - first_date.toordinal() + 1, len(currencies)))
+        for on_date, table in tables.items():
+            rates[on_date.toordinal() - first_date.toordinal()] = [table.get(c) or 0 for c in currencies]
+        return RateMatrix(currencies, rates, first_date)
+
+    @staticmethod
+    def from_history(store: RateHistoryStore) -> "RateMatrix | None":
+        """Zero-copy view of the mapped history file, None if there is no file."""
+        view = store.get_array_view()
+        if view is None:
+            return None
+        currencies, first_ordinal, buffer, offset, days = view
+        rates = np.frombuffer(buffer, dtype="<f8", count=days * len(currencies), offset=offset)
+        return RateMatrix(currencies, rates.reshape(days, len(currencies)), date.fromordinal(first_ordinal))
+
+    def currency_indices(self, currencies: np.ndarray) -> np.ndarray:
+        """Column of each currency code, -1 for codes not in the matrix."""
+        positions = np.searchsorted(self.currencies, currencies, sorter=self._order)
+        positions = np.clip(positions, 0, len(self.currencies) - 1)
+        indices = self._order[positions]
+        return np.where(self.currencies[indices] == currencies, indices, -1)
+
+    def day_indices(self, dates: np.ndarray) -> np.ndarray:
+        """Row of each date, -1 for dates out of the matrix."""
+        days = dates.astype("datetime64[D]").astype(np.int64) + date(1970, 1, 1).toordinal() - self.first_ordinal
+        return np.where((days >= 0) & (days < len(self.rates)), days, -1)
+
+
+def convert(amounts,
+            from_currencies,
+            to_currencies,
+            dates,
+            matrix: RateMatrix) -> np.ndarray:
+    """
+    Converts columns of amounts in one batched operation: amount / rate of from currency * rate of to currency,
+    rates taken from the row of the date. `to_currencies` is a column or one code for all rows.
+    Amounts whose rates are unknown or zero become NaN, amounts already in target currency are kept.
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    from_currencies = np.asarray(from_currencies)
+    to_currencies = np.broadcast_to(np.asarray(to_currencies), amounts.shape)
+    days = matrix.day_indices(np.asarray(dates, dtype="datetime64[D]"))
+    from_columns = matrix.currency_indices(from_currencies)
+    to_columns = matrix.currency_indices(to_currencies)
+
+    known = (days >= 0) & (from_columns >= 0) & (to_columns >= 0)
+    from_rates = np.where(known, matrix.rates[days, from_columns], 0.0)
+    to_rates = np.where(known, matrix.rates[days, to_columns], 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        converted = np.where((from_rates > 0) & (to_rates > 0), amounts / from_rates * to_rates, np.nan)
+    return np.where(from_currencies == to_currencies, amounts, converted)
+
+
+def parse_dates(dates: list[str]) -> np.ndarray:
+    """ISO date strings, as stored in FSM and reports, to a datetime64 column."""
+    return np.array([dt.strptime(d, '%Y-%m-%d').date() for d in dates], dtype="datetime64[D]")
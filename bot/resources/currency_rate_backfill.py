@@ -0,0 +1,81 @@
+"""
+Bulk loads historical rates of a date range into `currency_rates`, so lookups of those dates become local reads.
+Rates for every supported base are derived from the pivot table, so only the pivot table of each date is loaded.
+Dates that already have a valid table are skipped, so an interrupted run is resumed by running it again.
+
+Usage (from the bot directory):
+    python -m resources.currency_rate_backfill 2024-01-01 2024-12-31 [--concurrency 4]
+"""
+import argparse
+import asyncio
+import sys
+from datetime import date, datetime as dt, timedelta as td
+
+from sqlalchemy import select
+
+from database.database import DatabaseFacade
+from database.models import CurrencyRates
+from resources.currency_rate_cache import CurrencyRateCache
+from resources.currency_rate_extractor import CurrencyRateExtractor, SUPPORTED_BASE_CURRENCIES
+
+
+async def get_loaded_dates(db: DatabaseFacade, pivot_currency: str, date_from: date, date_to: date) -> set[date]:
+    async with db.get_async_session() as session:
+        return set((await session.scalars(
+            select(CurrencyRates.rate_date).filter(
+                CurrencyRates.base == pivot_currency,
+                CurrencyRates.rate_date.between(date_from, date_to),
+                CurrencyRates.rates[pivot_currency].as_float() > 0
+            )
+        )).all())
+
+
+async def backfill_currency_rates(date_from: date, date_to: date, concurrency: int = 4) -> list[str]:
+    """Returns dates which could not be loaded."""
+    db = DatabaseFacade()
+    extractor = CurrencyRateExtractor(SUPPORTED_BASE_CURRENCIES, CurrencyRateCache(db))
+    loaded_dates = await get_loaded_dates(db, extractor.pivot_currency, date_from, date_to)
+    dates_to_load = [
+        (date_from + td(days=d)).isoformat()
+        for d in range((date_to - date_from).days + 1)
+        if date_from + td(days=d) not in loaded_dates
+    ]
+    print(f"{len(loaded_dates)} dates already loaded, {len(dates_to_load)} to load")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    failed_dates = []
+
+    async def load(on_date: str):
+        async with semaphore:
+            table = await extractor.extract_pivot_rates(on_date)
+        if not any(table["rates"].values()):
+            failed_dates.append(on_date)
+
+    for i in range(0, len(dates_to_load), 100):
+        await asyncio.gather(*[load(on_date) for on_date in dates_to_load[i:i + 100]])
+        print(f"Processed {min(i + 100, len(dates_to_load))}/{len(dates_to_load)}, failed so far: {len(failed_dates)}")
+    return sorted(failed_dates)
+
+
+async def main(args: argparse.Namespace) -> int:
+    try:
+        failed_dates = await backfill_currency_rates(
+            dt.strptime(args.date_from, '%Y-%m-%d').date(),
+            min(dt.strptime(args.date_to, '%Y-%m-%d').date(), dt.now().date()),
+            args.concurrency
+        )
+    finally:
+        await CurrencyRateExtractor.close()
+        await DatabaseFacade.get_async_engine().dispose()
+    if failed_dates:
+        print(f"Not loaded: {', '.join(failed_dates)}")
+    print(f"Provider stats: {CurrencyRateExtractor.provider_stats.get_stats()}")
+    return 1 if failed_dates else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk load historical currency rates.")
+    parser.add_argument("date_from", help="first date to load, YYYY-MM-DD")
+    parser.add_argument("date_to", help="last date to load, YYYY-MM-DD, capped by today")
+    parser.add_argument("--concurrency", type=int, default=4, help="max parallel provider requests")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,99 @@
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime as dt, timezone
+from functools import lru_cache
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from database.database import DatabaseFacade
+from database.models import CurrencyRates
+
+
+class CurrencyRateCache:
+    """
+    Two-tier cache of rates tables keyed by (on_date, base currency):
+    in-process LRU in front of `currency_rates` table.
+    Tables of past dates never expire, table of today is refetched after `today_ttl` seconds.
+    Zero-filled tables (all providers failed) are never cached.
+    """
+
+    def __init__(self,
+                 db: DatabaseFacade,
+                 max_size: int = int(os.getenv("CURRENCY_RATES_CACHE_SIZE", 1024)),
+                 today_ttl: int = int(os.getenv("CURRENCY_RATES_TODAY_TTL", 3600))):
+        self.db = db
+        self.max_size = max_size
+        self.today_ttl = today_ttl
+        self._memory: OrderedDict[tuple[str, str], tuple[dict[str, float], float]] = OrderedDict()
+        self.stats = {"memory_hits": 0, "db_hits": 0, "misses": 0}
+
+    @staticmethod
+    @lru_cache
+    def get_shared() -> "CurrencyRateCache":
+        return CurrencyRateCache(DatabaseFacade())
+
+    def get_stats(self) -> dict[str, int | float]:
+        lookups = sum(self.stats.values())
+        return {
+            **self.stats,
+            "hit_ratio": round((lookups - self.stats["misses"]) / lookups, 4) if lookups else 0.0,
+            "memory_size": len(self._memory),
+        }
+
+    async def get(self, on_date: str, base_currency: str) -> dict[str, str | dict[str, float]] | None:
+        key = (on_date, base_currency)
+        if key in self._memory:
+            rates, fetched_at = self._memory[key]
+            if not self.__is_expired(on_date, fetched_at):
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return {"base": base_currency, "rates": rates}
+            del self._memory[key]
+
+        # own session, cache must never commit or roll back the unit of work of the caller
+        async with self.db.get_async_session_maker()() as db:
+            stored = (await db.execute(
+                select(CurrencyRates.rates, CurrencyRates.updated_at).filter(
+                    CurrencyRates.rate_date == dt.strptime(on_date, '%Y-%m-%d').date(),
+                    CurrencyRates.base == base_currency
+                )
+            )).first()
+        if stored and any(stored.rates.values()):
+            fetched_at = stored.updated_at.replace(tzinfo=timezone.utc).timestamp()
+            if not self.__is_expired(on_date, fetched_at):
+                self.__remember(key, stored.rates, fetched_at)
+                self.stats["db_hits"] += 1
+                return {"base": base_currency, "rates": stored.rates}
+
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, on_date: str, rates: dict[str, str | dict[str, float]]):
+        if not any(rates["rates"].values()):
+            return
+        self.__remember((on_date, rates["base"]), rates["rates"], time.time())
+        statement = insert(CurrencyRates).values(
+            rate_date=dt.strptime(on_date, '%Y-%m-%d').date(),
+            base=rates["base"],
+            rates=rates["rates"]
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=["rate_date", "base"],
+            set_={"rates": statement.excluded.rates, "updated_at": dt.utcnow()}
+        )
+        async with self.db.get_async_session_maker()() as db:
+            await db.execute(statement)
+            await db.commit()
+
+    def __remember(self, key: tuple[str, str], rates: dict[str, float], fetched_at: float):
+        self._memory[key] = (rates, fetched_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def __is_expired(self, on_date: str, fetched_at: float) -> bool:
+        if on_date < dt.date(dt.now()).isoformat():
+            return False
+        return time.time() - fetched_at > self.today_ttl
@@ -1,44 +1,191 @@
+import asyncio
 import os
+import time
 from datetime import datetime as dt
-import requests as r
 
-import freecurrencyapi as fca
+import aiohttp
+
+from resources.currency_rate_cache import CurrencyRateCache
+from resources.rate_history_store import RateHistoryStore
+from resources.rate_provider_stats import RateProviderStats
+
+SUPPORTED_BASE_CURRENCIES = ["USD", "EUR", "RUB", "TRY", "GEL", "RSD", "AMD"]
 
 
 class CurrencyRateExtractor:
-    def __init__(self, supported_currencies: list[str]):
+    _http_session: aiohttp.ClientSession | None = None
+    _in_flight: dict[tuple[str, str], asyncio.Future] = {}
+    coalesced_requests: int = 0
+    provider_stats = RateProviderStats()
+
+    def __init__(self,
+                 supported_currencies: list[str],
+                 rate_cache: CurrencyRateCache | None = None,
+                 pivot_currency: str = os.getenv("CURRENCY_RATES_PIVOT", "USD"),
+                 rate_history: RateHistoryStore | None = None):
         self.supported_currencies = supported_currencies
+        self.rate_cache = rate_cache
+        self.rate_history = rate_history
+        self.pivot_currency = pivot_currency
+        # off - next provider only after failure, delay - also when current one is slower than hedge_delay,
+        # race - all providers at once; first valid table wins, the rest are cancelled
+        self.hedging_mode = os.getenv("CURRENCY_RATES_HEDGING", "delay")
+        self.hedge_delay = float(os.getenv("CURRENCY_RATES_HEDGE_DELAY", 0.5))
+        self.providers = {
+            "cdn_jsdelivr": self.__extract_from_cdn_jsdelivr_api,
+            "pages_dev": self.__extract_from_pages_dev_api,
+            "freecurrencyapi": self.__extract_from_freecurrency_api,
+        }
+
+    @classmethod
+    def get_http_session(cls) -> aiohttp.ClientSession:
+        """One keep-alive client shared by all extractors, created lazily inside the running loop."""
+        if cls._http_session is None or cls._http_session.closed:
+            cls._http_session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(
+                    total=float(os.getenv("CURRENCY_RATES_HTTP_TIMEOUT", 5)),
+                    connect=float(os.getenv("CURRENCY_RATES_HTTP_CONNECT_TIMEOUT", 2))
+                ),
+                connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300, keepalive_timeout=60),
+                raise_for_status=True
+            )
+        return cls._http_session
 
-    def extract_currency_rates(
+    @classmethod
+    async def close(cls):
+        if cls._http_session is not None and not cls._http_session.closed:
+            await cls._http_session.close()
+
+    async def extract_currency_rates(
             self,
             base_currency: str = "USD",
-            on_date: str = dt.date(dt.now()).isoformat()) -> dict[str, str | dict[str, float]]:
-        cdn_jsdelivr_rates = self.__extract_from_cdn_jsdelivr_api(base_currency, on_date)
-        if "error_details" in cdn_jsdelivr_rates:
-            freecurrencyapi_rates = self.__extract_from_freecurrency_api(base_currency, on_date)
-            if "error_details" in freecurrencyapi_rates:
-                return {
-                    "base": base_currency,
-                    "rates": {c: 0 for c in self.supported_currencies}
-                }
-            return freecurrencyapi_rates
-        return cdn_jsdelivr_rates
+            on_date: str | None = None) -> dict[str, str | dict[str, float]]:
+        return self.derive_rates(await self.extract_pivot_rates(on_date), base_currency)
+
+    async def extract_pivot_rates(self, on_date: str | None = None) -> dict[str, str | dict[str, float]]:
+        """Rates table of pivot currency, the only one fetched and cached per date."""
+        on_date = on_date or dt.date(dt.now()).isoformat()
+        key = (on_date, self.pivot_currency)
+        in_flight = CurrencyRateExtractor._in_flight.get(key)
+        if in_flight is None:
+            in_flight = asyncio.ensure_future(self.__extract_currency_rates(self.pivot_currency, on_date))
+            CurrencyRateExtractor._in_flight[key] = in_flight
+            in_flight.add_done_callback(lambda _: CurrencyRateExtractor._in_flight.pop(key, None))
+        else:
+            CurrencyRateExtractor.coalesced_requests += 1
+        # shielded: caller being cancelled must not cancel the lookup other callers are waiting for
+        return await asyncio.shield(in_flight)
+
+    async def __extract_currency_rates(self, base_currency: str, on_date: str) -> dict[str, str | dict[str, float]]:
+        """Single lookup behind the coalescing layer: local rate history of past dates, cache, providers on miss."""
+        if self.rate_history and on_date < dt.date(dt.now()).isoformat():
+            # tables in the history file are built from stored ones, so they are not put back to the cache
+            history_rates = self.rate_history.get(on_date)
+            if history_rates:
+                return {"base": base_currency, "rates": history_rates}
+
+        if self.rate_cache:
+            cached_rates = await self.rate_cache.get(on_date, base_currency)
+            if cached_rates:
+                return cached_rates
+
+        rates = await self.__fetch_currency_rates(base_currency, on_date)
+        if self.rate_cache:
+            await self.rate_cache.put(on_date, rates)
+        return rates
+
+    async def __fetch_currency_rates(self, base_currency: str, on_date: str) -> dict[str, str | dict[str, float]]:
+        ranked_providers = iter(self.provider_stats.rank(list(self.providers)))
+        pending: set[asyncio.Task] = set()
+
+        def ask_next_provider() -> bool:
+            provider = next(ranked_providers, None)
+            if provider:
+                pending.add(asyncio.ensure_future(self.__ask_provider(provider, base_currency, on_date)))
+            return provider is not None
+
+        ask_next_provider()
+        if self.hedging_mode == "race":
+            while ask_next_provider():
+                pass
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=self.hedge_delay if self.hedging_mode == "delay" else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    ask_next_provider()
+                    continue
+                for task in done:
+                    rates = task.result()
+                    if "error_details" not in rates:
+                        return rates
+                ask_next_provider()
+        finally:
+            for task in pending:
+                task.cancel()
+        return {
+            "base": base_currency,
+            "rates": {c: 0 for c in self.supported_currencies}
+        }
+
+    async def __ask_provider(self, provider: str, base_currency: str, on_date: str) -> dict[str, str | dict[str, float]]:
+        started_at = time.monotonic()
+        try:
+            rates = await self.providers[provider](base_currency, on_date)
+        except asyncio.CancelledError:
+            # lost the hedge race, slow providers must not keep their rank
+            self.provider_stats.record_cancelled(provider, time.monotonic() - started_at)
+            raise
+        self.provider_stats.record(provider, time.monotonic() - started_at, "error_details" in rates)
+        return rates
+
+    def derive_rates(self,
+                     rates: dict[str, str | dict[str, float]],
+                     base_currency: str) -> dict[str, str | dict[str, float]]:
+        """Cross rates for any base from the table of another base: X per base = X per pivot / base per pivot."""
+        if rates["base"] == base_currency:
+            return rates
+        base_rate = rates["rates"].get(base_currency)
+        if not base_rate:
+            return {
+                "base": base_currency,
+                "rates": {c: 0 for c in self.supported_currencies}
+            }
+        return {
+            "base": base_currency,
+            "rates": {c: rate / base_rate for c, rate in rates["rates"].items()}
+        }
 
     @staticmethod
-    def __extract_from_freecurrency_api(
-            base_currency: str = "USD",
-            on_date: str = dt.date(dt.now()).isoformat()) -> dict[str, str | dict[str, float]]:
-        api_key = os.getenv("FREECURRENCYAPI_API_KEY")
-        client = fca.Client(api_key=api_key)
+    def convert(amount: float, from_currency: str, to_currency: str, rates: dict[str, float]) -> float | None:
+        """Converts amount via rates table of any base, None if one of the rates is unknown or zero."""
+        if from_currency == to_currency:
+            return amount
+        if not rates.get(from_currency) or not rates.get(to_currency):
+            return None
+        return amount / rates[from_currency] * rates[to_currency]
+
+    @staticmethod
+    async def __extract_from_freecurrency_api(
+            base_currency: str,
+            on_date: str) -> dict[str, str | dict[str, float]]:
+        """Docs: https://freecurrencyapi.com/docs"""
+        is_latest = on_date == dt.date(dt.now()).isoformat()
+        params = {
+            "apikey": os.getenv("FREECURRENCYAPI_API_KEY", ""),
+            "base_currency": base_currency
+        }
+        if not is_latest:
+            params["date"] = on_date
         try:
-            currency_rate = client.latest(base_currency)['data'] \
-                if on_date == dt.date(dt.now()).isoformat() \
-                else list(
-                    client.historical(
-                        date=on_date,
-                        base_currency=base_currency
-                    )['data'].values()
-                )[0]
+            async with CurrencyRateExtractor.get_http_session().get(
+                    f"https://api.freecurrencyapi.com/v1/{'latest' if is_latest else 'historical'}",
+                    params=params) as res:
+                data = (await res.json())["data"]
+            currency_rate = data if is_latest else list(data.values())[0]
         except Exception as e:
             return {
                 "error_details": str(e)
@@ -49,43 +196,51 @@ class CurrencyRateExtractor:
         }
 
     @staticmethod
-    def __extract_from_cdn_jsdelivr_api(
-            base_currency: str = "USD",
-            on_date: str = dt.date(dt.now()).isoformat()) -> dict[str, str | dict[str, float]]:
+    async def __extract_from_cdn_jsdelivr_api(
+            base_currency: str,
+            on_date: str) -> dict[str, str | dict[str, float]]:
         """Docs: https://github.com/fawazahmed0/exchange-api?tab=readme-ov-file"""
+        return await CurrencyRateExtractor.__extract_from_exchange_api(
+            f"https://cdn.jsdelivr.net/npm/@fawazahmed0/currency-api@"
+            f"{on_date}/v1/currencies/{base_currency.lower()}.json",
+            base_currency
+        )
 
-        main_url = (f"https://cdn.jsdelivr.net/npm/@fawazahmed0/currency-api@"
-                    f"{on_date}/v1/currencies/{base_currency.lower()}.json")
-        fallback_url = (f"https://{on_date}.currency-api.pages.dev/v1/currencies/"
-                        f"{base_currency.lower()}.json")
+    @staticmethod
+    async def __extract_from_pages_dev_api(
+            base_currency: str,
+            on_date: str) -> dict[str, str | dict[str, float]]:
+        """Fallback domain of the same exchange-api."""
+        return await CurrencyRateExtractor.__extract_from_exchange_api(
+            f"https://{on_date}.currency-api.pages.dev/v1/currencies/{base_currency.lower()}.json",
+            base_currency
+        )
 
+    @staticmethod
+    async def __extract_from_exchange_api(url: str, base_currency: str) -> dict[str, str | dict[str, float]]:
         try:
-            res = r.get(main_url)
-            raw_rates = res.json()
+            async with CurrencyRateExtractor.get_http_session().get(url) as res:
+                raw_rates = await res.json(content_type=None)
             rates = {k.upper(): v for k, v in raw_rates[base_currency.lower()].items()}
         except Exception as e:
-            try:
-                res = r.get(fallback_url)
-                raw_rates = res.json()
-                rates = {k.upper(): v for k, v in raw_rates[base_currency.lower()].items()}
-            except Exception as e:
-                return {
-                    "error_details": str(e)
-                }
+            return {
+                "error_details": str(e)
+            }
         return {"base": base_currency, "rates": rates}
 
     @staticmethod
-    def __extract_from_vatcomply_api(
-            base_currency: str = "USD",
-            on_date: str = dt.date(dt.now()).isoformat()) -> dict[str, str | dict[str, float]]:
+    async def __extract_from_vatcomply_api(
+            base_currency: str,
+            on_date: str) -> dict[str, str | dict[str, float]]:
         # DEPRECATED
         params = {
             "base": base_currency,
             "date": on_date
         }
         try:
-            res = r.get(url="https://api.vatcomply.com/rates", params=params)
-            rates = res.json()
+            async with CurrencyRateExtractor.get_http_session().get("https://api.vatcomply.com/rates",
+                                                                    params=params) as res:
+                rates = await res.json()
         except Exception as e:
             return {
                 "error_details": str(e)
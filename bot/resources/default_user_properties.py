@@ -0,0 +1,95 @@
+"""
+Default properties of a user and set-based provisioning of them.
+
+Admin bulk reset (from the bot directory):
+    python -m resources.default_user_properties [--reset] user_id [user_id ...]
+"""
+import argparse
+import asyncio
+from datetime import datetime as dt
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.database import DatabaseFacade
+from database.models import Users, UsersProperties
+from resources.reference_data import ReferenceData
+
+DEFAULT_USER_PROPERTIES = {
+    "categories": [
+        "Fun", "Clothes", "Transportation", "Eat outside",
+        "Food", "Facilities", "Medicine", "Home", "Other", "Rent"
+    ],
+    "base_currency": {
+        "base_currency": "USD"
+    },
+    "amounts": {
+        "default": [1, 3, 5, 7, 10, 15, 25, 30],
+        "Transportation": [5, 15, 20, 30, 50],
+        "Eat outside": [10, 15, 20, 25, 30, 40, 50, 60]
+    },
+    "comments": {
+        "default": ["Groceries", "Weekly groceries", "Cafe", "Restaurant",
+                    "MyFavoriteDoner", "Taxi", "Public transport", "Water",
+                    "Electricity", "Heating", "Internet"]
+    },
+}
+
+
+async def upsert_users(db_session: AsyncSession, user_ids: list[int]):
+    await db_session.execute(
+        insert(Users)
+        .values([{"user_id": user_id, "user_role": "viewer", "created_at": dt.utcnow(), "updated_at": dt.utcnow()}
+                 for user_id in user_ids])
+        .on_conflict_do_nothing(index_elements=["id"])
+    )
+
+
+async def upsert_default_properties(db_session: AsyncSession,
+                                    user_ids: list[int],
+                                    property_names: list[str],
+                                    override: bool = False):
+    """
+    Provisions default values of properties for all users in one statement.
+    Existing values are reset when `override` is set, otherwise they are kept.
+    Properties without a default value are skipped.
+    """
+    reference_data = ReferenceData.get_shared()
+    rows = [
+        {
+            "user_id": user_id,
+            "property_id": await reference_data.get_property_id(property_name),
+            "property_value": DEFAULT_USER_PROPERTIES[property_name],
+            "created_at": dt.utcnow(),
+            "updated_at": dt.utcnow()
+        }
+        for user_id in user_ids
+        for property_name in property_names if property_name in DEFAULT_USER_PROPERTIES
+    ]
+    if not rows:
+        return
+    statement = insert(UsersProperties).values(rows)
+    if override:
+        statement = statement.on_conflict_do_update(
+            index_elements=["property_id", "user_id"],
+            set_={"property_value": statement.excluded.property_value, "updated_at": statement.excluded.updated_at}
+        )
+    else:
+        statement = statement.on_conflict_do_nothing(index_elements=["property_id", "user_id"])
+    await db_session.execute(statement)
+
+
+async def main(args: argparse.Namespace):
+    async with DatabaseFacade().get_async_session() as db:
+        await upsert_users(db, args.user_ids)
+        await upsert_default_properties(db, args.user_ids, list(DEFAULT_USER_PROPERTIES), override=args.reset)
+        await db.commit()
+    await DatabaseFacade.get_async_engine().dispose()
+    print(f"Default properties {'reset' if args.reset else 'provisioned'} for {len(args.user_ids)} users")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Provision or reset default properties of users.")
+    parser.add_argument("user_ids", type=int, nargs="+")
+    parser.add_argument("--reset", action="store_true", help="overwrite current values with defaults")
+    asyncio.run(main(parser.parse_args()))
@@ -61,8 +61,10 @@ WRONG_TIME_FORMAT = "⛔️Wrong time format.\n"
 WRONG_DATE_TIMELINESS = "⛔️Input cannot contain future dates.\n"
 WRONG_NO_SHORTCUTS = "⛔No shortcuts registered. Please use /settings command to set one up."
 
+SAVING_RECORD = "⏳*Saving expense...*\n\nData to be recorded:\n"
 SUCCESS_RECORD = "✅*Expense has been recorded!*\n\nRecorded data:\n"
 FAILED_RECORD = "⛔️*NOT recorded!*\n\nData to be recorded:\n"
+EXPENSE_NOT_SAVED = "⛔️This expense is not saved, it can not be edited or deleted."
 
 HEALTH_CHECK = ("I'm alive, everything is perfect🙃 "
                 "This message will be deleted in 2 seconds.")
@@ -1,6 +1,9 @@
+from uuid import UUID
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
 
 from resources.helpers import chunk_list
+from resources.callback_data import ExpenseCallback, pack_expense_id
 
 
 def build_date_keyboard(include_back_button: bool = False):
@@ -62,11 +65,17 @@ def build_listlike_keyboard(entities: list[str],
     return kyb
 
 
-def build_edit_mode_main_keyboard():
-    return build_listlike_keyboard(
-        ["edit", "delete"],
-        title_button_names=True
-    )
+def build_edit_mode_main_keyboard(expense_id: UUID | str | None = None):
+    if expense_id is None:
+        return build_listlike_keyboard(
+            ["edit", "delete"],
+            title_button_names=True
+        )
+    ref = pack_expense_id(expense_id)
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text=action.title(), callback_data=ExpenseCallback(action=action, ref=ref).pack())
+        for action in ["edit", "delete"]
+    ]])
 
 def build_edit_mode_keyboard():
     return build_listlike_keyboard(
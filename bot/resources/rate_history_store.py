@@ -0,0 +1,140 @@
+"""
+Compact binary rate history: rates per pivot currency as a fixed-width float64 array of (date x currency),
+read through mmap, so a lookup is an offset computation instead of JSON parsing or HTTP.
+Every 3-letter code found in stored pivot tables is kept, so tables served from the file are not truncated.
+
+Layout (little-endian):
+    header   - magic b"RHS1", currencies count (H), first date ordinal (I), days count (I)
+    codes    - 3 ascii bytes per currency
+    rows     - one row per day from the first date, `currencies count` float64 each, 0 for unknown rates
+
+Build from tables stored in `currency_rates` (from the bot directory):
+    python -m resources.rate_history_store [path]
+"""
+import asyncio
+import mmap
+import os
+import struct
+import sys
+from datetime import date, datetime as dt
+from functools import lru_cache
+
+from sqlalchemy import select
+
+from database.database import DatabaseFacade
+from database.models import CurrencyRates
+
+MAGIC = b"RHS1"
+HEADER = struct.Struct("<4sHII")
+CODE_SIZE = 3
+RATE_SIZE = struct.calcsize("<d")
+
+
+class RateHistoryStore:
+    """
+    Read-only view of a rate history file, mapped lazily on the first lookup.
+    A rebuilt file is picked up after `reload()`, the old mapping stays valid until then
+    and, while NumPy views of it are alive (see `RateMatrix.from_history`), until they are released.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mmap: mmap.mmap | None = None
+        self._currencies: list[str] = []
+        self._first_ordinal = 0
+        self._days = 0
+        self._row = struct.Struct("<")
+
+    @staticmethod
+    @lru_cache
+    def get_shared() -> "RateHistoryStore":
+        return RateHistoryStore(os.getenv("CURRENCY_RATES_HISTORY_PATH", "rate_history.bin"))
+
+    @property
+    def currencies(self) -> list[str]:
+        return self._currencies if self.__open() else []
+
+    def get(self, on_date: str) -> dict[str, float] | None:
+        """Known rates per pivot currency on the date, None if the date is out of the file or not loaded."""
+        if not self.__open():
+            return None
+        day = dt.strptime(on_date, '%Y-%m-%d').date().toordinal() - self._first_ordinal
+        if not 0 <= day < self._days:
+            return None
+        offset = HEADER.size + CODE_SIZE * len(self._currencies) + day * self._row.size
+        rates = {c: rate for c, rate in zip(self._currencies, self._row.unpack_from(self._mmap, offset)) if rate}
+        return rates or None
+
+    def get_array_view(self) -> tuple[list[str], int, mmap.mmap, int, int] | None:
+        """Currencies, first date ordinal, mapped buffer, offset of rows and days count for zero-copy readers."""
+        if not self.__open():
+            return None
+        return (self._currencies, self._first_ordinal, self._mmap,
+                HEADER.size + CODE_SIZE * len(self._currencies), self._days)
+
+    def reload(self):
+        mapping, self._mmap = self._mmap, None
+        if mapping is None:
+            return
+        try:
+            mapping.close()
+        except BufferError:
+            # still exported to NumPy views, it is unmapped when the last of them is garbage collected
+            pass
+
+    def __open(self) -> bool:
+        if self._mmap is not None:
+            return True
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, currencies_count, self._first_ordinal, self._days = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self.reload()
+            raise ValueError(f"{self.path} is not a rate history file")
+        codes = self._mmap[HEADER.size:HEADER.size + CODE_SIZE * currencies_count]
+        self._currencies = [codes[i:i + CODE_SIZE].decode() for i in range(0, len(codes), CODE_SIZE)]
+        self._row = struct.Struct(f"<{currencies_count}d")
+        return True
+
+    @staticmethod
+    def write(path: str, currencies: list[str], tables: dict[date, dict[str, float]]):
+        """Writes tables to a new file and atomically replaces the old one."""
+        first_date, last_date = min(tables), max(tables)
+        days = last_date.toordinal() - first_date.toordinal() + 1
+        row = struct.Struct(f"<{len(currencies)}d")
+        buffer = bytearray(HEADER.size + CODE_SIZE * len(currencies) + days * row.size)
+        HEADER.pack_into(buffer, 0, MAGIC, len(currencies), first_date.toordinal(), days)
+        buffer[HEADER.size:HEADER.size + CODE_SIZE * len(currencies)] = "".join(currencies).encode()
+        for on_date, rates in tables.items():
+            offset = HEADER.size + CODE_SIZE * len(currencies) \
+                + (on_date.toordinal() - first_date.toordinal()) * row.size
+            row.pack_into(buffer, offset, *[float(rates.get(c) or 0) for c in currencies])
+        with open(path + ".tmp", "wb") as f:
+            f.write(buffer)
+        os.replace(path + ".tmp", path)
+
+
+async def build_from_db(path: str, pivot_currency: str) -> int:
+    async with DatabaseFacade().get_async_session() as db:
+        stored = (await db.execute(
+            select(CurrencyRates.rate_date, CurrencyRates.rates)
+            .filter(CurrencyRates.base == pivot_currency)
+        )).all()
+    tables = {row.rate_date: row.rates for row in stored if any(row.rates.values())}
+    currencies = sorted({
+        code for rates in tables.values() for code in rates
+        if len(code) == CODE_SIZE and code.isascii() and code.isalpha()
+    })
+    if tables:
+        RateHistoryStore.write(path, currencies, tables)
+    await DatabaseFacade.get_async_engine().dispose()
+    return len(tables)
+
+
+if __name__ == "__main__":
+    history_path = sys.argv[1] if len(sys.argv) > 1 else RateHistoryStore.get_shared().path
+    loaded = asyncio.run(build_from_db(history_path, os.getenv("CURRENCY_RATES_PIVOT", "USD")))
+    print(f"{loaded} dates written to {history_path}")
+    sys.exit(0 if loaded else 1)
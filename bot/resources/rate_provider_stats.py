@@ -0,0 +1,71 @@
+from bisect import bisect_left
+
+
+class RateProviderStats:
+    """
+    Per-provider latency histogram and error counts of rate providers.
+    Smoothed latency and error rate are used to rank providers, so the fastest healthy one is asked first.
+    Hedged requests cancelled because another provider answered first are recorded too,
+    their elapsed time is a lower bound of latency, so it can only slow a provider down in the ranking.
+    """
+    LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, float("inf"))
+
+    def __init__(self, smoothing: float = 0.2, unhealthy_error_rate: float = 0.5):
+        self.smoothing = smoothing
+        self.unhealthy_error_rate = unhealthy_error_rate
+        self.providers: dict[str, dict] = {}
+
+    def record(self, provider: str, latency: float, is_error: bool):
+        stats = self.__get_provider_stats(provider)
+        bucket = bisect_left(self.LATENCY_BUCKETS, latency)
+        stats["requests"] += 1
+        stats["errors"] += is_error
+        stats["error_latency_histogram" if is_error else "latency_histogram"][bucket] += 1
+        stats["error_rate"] += self.smoothing * (is_error - stats["error_rate"])
+        if not is_error:
+            stats["avg_latency"] = latency if stats["avg_latency"] is None \
+                else stats["avg_latency"] + self.smoothing * (latency - stats["avg_latency"])
+
+    def record_cancelled(self, provider: str, elapsed: float):
+        stats = self.__get_provider_stats(provider)
+        stats["cancelled"] += 1
+        stats["cancelled_latency_histogram"][bisect_left(self.LATENCY_BUCKETS, elapsed)] += 1
+        if stats["avg_latency"] is None or elapsed > stats["avg_latency"]:
+            stats["avg_latency"] = elapsed if stats["avg_latency"] is None \
+                else stats["avg_latency"] + self.smoothing * (elapsed - stats["avg_latency"])
+
+    def rank(self, providers: list[str]) -> list[str]:
+        """
+        Healthy providers by smoothed latency penalized by error rate, then unhealthy ones.
+        Providers without successful responses keep their default order after measured ones.
+        """
+        def sort_key(provider: str):
+            stats = self.providers.get(provider)
+            if not stats or stats["avg_latency"] is None:
+                return bool(stats) and stats["error_rate"] > self.unhealthy_error_rate, \
+                    float("inf"), providers.index(provider)
+            return (stats["error_rate"] > self.unhealthy_error_rate,
+                    stats["avg_latency"] * (1 + stats["error_rate"]),
+                    providers.index(provider))
+        return sorted(providers, key=sort_key)
+
+    def __get_provider_stats(self, provider: str) -> dict:
+        return self.providers.setdefault(provider, {
+            "requests": 0,
+            "errors": 0,
+            "cancelled": 0,
+            "latency_histogram": [0] * len(self.LATENCY_BUCKETS),
+            "error_latency_histogram": [0] * len(self.LATENCY_BUCKETS),
+            "cancelled_latency_histogram": [0] * len(self.LATENCY_BUCKETS),
+            "avg_latency": None,
+            "error_rate": 0.0,
+        })
+
+    def get_stats(self) -> dict[str, dict]:
+        return {
+            provider: {
+                **stats,
+                "latency_buckets": [str(b) for b in self.LATENCY_BUCKETS],
+            }
+            for provider, stats in self.providers.items()
+        }
@@ -0,0 +1,72 @@
+import os
+import time
+from functools import lru_cache
+from uuid import UUID
+
+from sqlalchemy import select
+
+from database.database import DatabaseFacade
+from database.models import Categories, Properties
+
+
+class ReferenceData:
+    """
+    Name -> id maps of categories and properties. Both tables are tiny and change only through migrations,
+    so they are loaded at startup and reloaded on demand when an unknown name is asked for.
+    Such reloads happen at most once per `reload_interval` seconds, so typos and stale callback data
+    can not hammer the database; a name still unknown after that raises KeyError.
+    """
+
+    def __init__(self, db: DatabaseFacade, reload_interval: float = 60):
+        self.db = db
+        self.reload_interval = reload_interval
+        self.categories: dict[str, UUID] = {}
+        self.properties: dict[str, UUID] = {}
+        self.required_properties: list[str] = []
+        self._loaded_at: float | None = None
+
+    @staticmethod
+    @lru_cache
+    def get_shared() -> "ReferenceData":
+        return ReferenceData(DatabaseFacade(), float(os.getenv("REFERENCE_DATA_RELOAD_INTERVAL", 60)))
+
+    async def load(self):
+        async with self.db.get_async_session_maker()() as db:
+            self.categories = dict((await db.execute(
+                select(Categories.category_name, Categories.category_id)
+            )).tuples().all())
+            properties = (await db.execute(
+                select(Properties.property_name, Properties.property_id, Properties.is_required)
+            )).all()
+        self.properties = {p.property_name: p.property_id for p in properties}
+        self.required_properties = [p.property_name for p in properties if p.is_required]
+        self._loaded_at = time.monotonic()
+
+    async def get_category_id(self, category_name: str) -> UUID:
+        if category_name not in self.categories:
+            await self.__reload_on_miss()
+        return self.categories[category_name]
+
+    async def get_property_id(self, property_name: str) -> UUID:
+        if property_name not in self.properties:
+            await self.__reload_on_miss()
+        return self.properties[property_name]
+
+    async def get_category_names(self) -> list[str]:
+        if not self.categories:
+            await self.load()
+        return list(self.categories)
+
+    async def get_property_names(self) -> list[str]:
+        if not self.properties:
+            await self.load()
+        return list(self.properties)
+
+    async def get_required_property_names(self) -> list[str]:
+        if not self.properties:
+            await self.load()
+        return self.required_properties
+
+    async def __reload_on_miss(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.reload_interval:
+            await self.load()
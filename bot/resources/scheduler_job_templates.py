@@ -1,22 +1,32 @@
+import asyncio
+import os
 from datetime import datetime as dt, timedelta as td
 
+import numpy as np
 from aiogram import (
     Bot
 )
+from sqlalchemy import func, or_, select, update
 from sqlalchemy.sql import text
 
 from logger import Logger
 from database.database import DatabaseFacade
+from database.fsm_storage import PostgresStorage
+from database.models import CurrencyRates, Expenses
 from resources.analytics_sql_templates import DEFAULT_WEEKLY_REPORT
+from resources.currency_converter import RateMatrix, convert
+from resources.currency_rate_cache import CurrencyRateCache
+from resources.currency_rate_extractor import CurrencyRateExtractor, SUPPORTED_BASE_CURRENCIES
 
 
 async def job_send_message(user_id: int,
                            logger: Logger,
                            db: DatabaseFacade,
                            bot: Bot):
-    sql_for_report = DEFAULT_WEEKLY_REPORT.replace("{{user_id}}", str(user_id))
-    with db.get_session() as db:
-        db_payload = db.execute(text(sql_for_report)).mappings().all()
+    sql_for_report = DEFAULT_WEEKLY_REPORT.replace("{{user_id}}", str(user_id)) \
+                                          .replace("{{pivot_currency}}", os.getenv("CURRENCY_RATES_PIVOT", "USD"))
+    async with db.session_scope() as session:
+        db_payload = (await session.execute(text(sql_for_report))).mappings().all()
 
     if not db_payload:
         res = "Not enough data for report\."
@@ -40,3 +50,119 @@ async def job_send_message(user_id: int,
         text=f"*Weekly report for {week_start} \- {week_end}:*\n\n" + str(res),
         parse_mode="MarkdownV2"
     )
+
+
+async def job_prefetch_currency_rates(logger: Logger, days_back: int = 7):
+    """
+    System job warming the rate store: today's table and tables of recent days which are missing
+    or zero-filled. Rates for any supported base are derived from the pivot table, so only it is fetched.
+    """
+    extractor = CurrencyRateExtractor(SUPPORTED_BASE_CURRENCIES, CurrencyRateCache.get_shared())
+    dates = [(dt.now() - td(days=d)).date().isoformat() for d in range(days_back + 1)]
+    cache_stats_before = dict(extractor.rate_cache.stats)
+    tables = await asyncio.gather(*[extractor.extract_pivot_rates(on_date) for on_date in dates])
+
+    fetched = extractor.rate_cache.stats["misses"] - cache_stats_before["misses"]
+    failed = [on_date for on_date, table in zip(dates, tables) if not any(table["rates"].values())]
+    logger.log("Prefetch Currency Rates", "system",
+               f"Checked {len(dates)} dates, fetched {fetched}, failed: {failed or 'none'}",
+               level="warn" if failed else "info")
+
+
+async def job_repair_zero_rated_expenses(logger: Logger,
+                                         max_batches: int = 50,
+                                         retry_after: int = int(os.getenv("CURRENCY_RATES_REPAIR_INTERVAL", 15)) * 60,
+                                         max_retry_after: int = 86400):
+    """
+    System job rerating expenses saved while all rate providers were down.
+    Flagged expenses are batched by their (date, base) rates table, each table is fetched once,
+    then the table and amounts in base currency of its expenses are bulk updated.
+    Amounts are converted in one batched operation over the repaired tables.
+    Tables never tried and recent dates go first. A table that still can not be fetched is retried
+    `retry_after` seconds later, the delay doubles with every failed attempt up to `max_retry_after`,
+    so dates no provider has do not hold up the rest of the queue.
+    """
+    db = DatabaseFacade()
+    extractor = CurrencyRateExtractor(SUPPORTED_BASE_CURRENCIES, CurrencyRateCache.get_shared())
+    retry_delay = func.make_interval(0, 0, 0, 0, 0, 0, func.least(
+        retry_after * func.power(2, CurrencyRates.rerating_attempts - 1), max_retry_after
+    ))
+    async with db.session_scope() as session:
+        batches = (await session.execute(
+            select(CurrencyRates.currency_rate_id, CurrencyRates.rate_date, CurrencyRates.base)
+            .filter(
+                CurrencyRates.currency_rate_id.in_(
+                    select(Expenses.currency_rate_id).filter(Expenses.needs_rerating)
+                ),
+                or_(
+                    CurrencyRates.rerating_attempted_at.is_(None),
+                    CurrencyRates.rerating_attempted_at + retry_delay <= dt.utcnow()
+                )
+            )
+            .order_by(CurrencyRates.rerating_attempts, CurrencyRates.rate_date.desc())
+            .limit(max_batches)
+        )).all()
+    if not batches:
+        return
+
+    # no transaction is held open while providers are asked
+    tables = await asyncio.gather(*[
+        extractor.extract_currency_rates(batch.base, batch.rate_date.isoformat()) for batch in batches
+    ])
+    repaired = {
+        batch.currency_rate_id: table["rates"]
+        for batch, table in zip(batches, tables) if any(table["rates"].values())
+    }
+    failed = [batch.currency_rate_id for batch in batches if batch.currency_rate_id not in repaired]
+    expenses = []
+    async with db.session_scope() as session:
+        if failed:
+            await session.execute(
+                update(CurrencyRates)
+                .filter(CurrencyRates.currency_rate_id.in_(failed))
+                .values(rerating_attempts=CurrencyRates.rerating_attempts + 1, rerating_attempted_at=dt.utcnow())
+            )
+        if repaired:
+            expenses = (await session.execute(
+                select(Expenses.expense_id, Expenses.currency_rate_id, Expenses.amount,
+                       Expenses.currency, Expenses.base_currency)
+                .filter(Expenses.needs_rerating, Expenses.currency_rate_id.in_(repaired))
+            )).all()
+            await session.execute(update(CurrencyRates), [
+                {"currency_rate_id": currency_rate_id, "rates": rates, "updated_at": dt.utcnow()}
+                for currency_rate_id, rates in repaired.items()
+            ])
+            if expenses:
+                rate_dates = {batch.currency_rate_id: batch.rate_date for batch in batches}
+                # tables of one date are all derived from its pivot table, so any of them gives the same cross rates
+                matrix = RateMatrix.from_tables(
+                    {rate_dates[currency_rate_id]: rates for currency_rate_id, rates in repaired.items()},
+                    sorted({currency for rates in repaired.values() for currency in rates})
+                )
+                amounts_in_base_currency = convert(
+                    [expense.amount for expense in expenses],
+                    [expense.currency for expense in expenses],
+                    [expense.base_currency or "" for expense in expenses],
+                    [rate_dates[expense.currency_rate_id] for expense in expenses],
+                    matrix
+                )
+                await session.execute(update(Expenses), [
+                    {
+                        "expense_id": expense.expense_id,
+                        "amount_in_base_currency": None if np.isnan(amount) else float(amount),
+                        "needs_rerating": False
+                    }
+                    for expense, amount in zip(expenses, amounts_in_base_currency)
+                ])
+        await session.commit()
+
+    logger.log("Repair Zero Rated Expenses", "system",
+               f"Repaired {len(repaired)}/{len(batches)} rates tables, rerated {len(expenses)} expenses",
+               level="info" if len(repaired) == len(batches) else "warn")
+
+
+async def job_evict_stale_fsm_states(logger: Logger):
+    """System job deleting flows abandoned for longer than FSM TTL."""
+    evicted = await PostgresStorage.evict_stale(DatabaseFacade())
+    if evicted:
+        logger.log("Evict Stale FSM States", "system", f"Evicted {evicted} abandoned flows")
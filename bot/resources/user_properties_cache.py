@@ -0,0 +1,67 @@
+import copy
+import os
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any
+
+from sqlalchemy import select
+
+from database.database import DatabaseFacade
+from database.models import Properties, UsersProperties
+
+
+class UserPropertiesCache:
+    """
+    In-process LRU of all properties of a user (name -> value), loaded in one query on the first lookup.
+    Setup handlers invalidate the user after they commit a change, `ttl` bounds staleness
+    when the change is committed by another bot process.
+    Values are returned as copies, callers are free to mutate them.
+    """
+
+    def __init__(self,
+                 db: DatabaseFacade,
+                 max_size: int = int(os.getenv("USER_PROPERTIES_CACHE_SIZE", 10000)),
+                 ttl: int = int(os.getenv("USER_PROPERTIES_CACHE_TTL", 300))):
+        self.db = db
+        self.max_size = max_size
+        self.ttl = ttl
+        self._users: OrderedDict[int, tuple[dict[str, Any], float]] = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    @staticmethod
+    @lru_cache
+    def get_shared() -> "UserPropertiesCache":
+        return UserPropertiesCache(DatabaseFacade())
+
+    async def get(self, user_id: int, property_name: str, default: Any = None) -> Any:
+        value = (await self.__get_properties(user_id)).get(property_name, default)
+        return copy.deepcopy(value)
+
+    def invalidate(self, user_id: int):
+        self.stats["invalidations"] += 1
+        self._users.pop(user_id, None)
+
+    async def __get_properties(self, user_id: int) -> dict[str, Any]:
+        if user_id in self._users:
+            properties, loaded_at = self._users[user_id]
+            if time.time() - loaded_at <= self.ttl:
+                self._users.move_to_end(user_id)
+                self.stats["hits"] += 1
+                return properties
+
+        self.stats["misses"] += 1
+        # own session, only committed values are cached
+        async with self.db.get_async_session_maker()() as db:
+            properties = dict((await db.execute(
+                select(Properties.property_name, UsersProperties.property_value)
+                .join(Properties, UsersProperties.property_id == Properties.property_id)
+                .filter(UsersProperties.user_id == user_id)
+            )).tuples().all())
+        # users without properties are not cached, they are about to run setup
+        if properties:
+            self._users[user_id] = (properties, time.time())
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+        return properties
@@ -4,6 +4,7 @@ import logging
 import os
 
 from bot import BotRunner
+from webhook_server import WebhookServer
 
 
 async def main():
@@ -15,8 +16,16 @@ async def main():
     await bot.on_startup()
     bot.register_handlers()
     bot.logger.log(bot, "admin", extra_text=f"Bot started: {datetime.datetime.now()}")
-    await bot.dispatcher.start_polling(bot.bot)
-    await bot.shutdown()
+    try:
+        match os.getenv("EXPENSE_BOT_RUN_MODE", "polling"):
+            case "webhook":
+                await WebhookServer(bot).run()
+            case _:
+                # Telegram refuses getUpdates while a webhook set in webhook mode is still active
+                await bot.bot.delete_webhook()
+                await bot.dispatcher.start_polling(bot.bot)
+    finally:
+        await bot.shutdown()
 
 
 if __name__ == "__main__":
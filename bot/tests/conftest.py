@@ -0,0 +1,13 @@
+import os
+
+import pytest
+
+from database.database import DatabaseFacade
+
+
+@pytest.fixture
+def database() -> DatabaseFacade:
+    """Migrated expense_bot database, tests using it roll their changes back."""
+    if not os.getenv("EXPENSE_BOT_DB_CONNECTION_STRING"):
+        pytest.skip("EXPENSE_BOT_DB_CONNECTION_STRING of a migrated database is not set")
+    return DatabaseFacade()
@@ -0,0 +1,57 @@
+import math
+from datetime import date
+
+import numpy as np
+import pytest
+
+from resources.currency_converter import RateMatrix, convert
+from resources.currency_rate_extractor import CurrencyRateExtractor
+
+TABLES = {
+    date(2024, 5, 1): {"USD": 1.0, "EUR": 0.9, "GEL": 2.7, "AMD": 0},
+    date(2024, 5, 3): {"USD": 1.0, "EUR": 0.92, "GEL": 2.65, "AMD": 388.0},
+}
+CURRENCIES = ["USD", "EUR", "GEL", "AMD"]
+
+
+def expected(amount: float, from_currency: str, to_currency: str, on_date: date) -> float | None:
+    return CurrencyRateExtractor.convert(amount, from_currency, to_currency, TABLES.get(on_date, {}))
+
+
+@pytest.mark.parametrize("to_currency", CURRENCIES + ["XXX"])
+def test_batched_conversion_matches_row_by_row(to_currency: str):
+    # 2024-05-02 is between tables and 2024-05-04 is after them, XXX is not in any table, AMD is zero on 2024-05-01
+    dates = [date(2024, 5, 1), date(2024, 5, 2), date(2024, 5, 3), date(2024, 5, 4)]
+    rows = [
+        (amount, from_currency, on_date)
+        for amount in (0.0, 12.5)
+        for from_currency in CURRENCIES + ["XXX"]
+        for on_date in dates
+    ]
+
+    converted = convert(
+        [amount for amount, _, _ in rows],
+        [from_currency for _, from_currency, _ in rows],
+        to_currency,
+        [on_date for _, _, on_date in rows],
+        RateMatrix.from_tables(TABLES, CURRENCIES)
+    )
+
+    for (amount, from_currency, on_date), batched in zip(rows, converted):
+        row_by_row = expected(amount, from_currency, to_currency, on_date)
+        if row_by_row is None:
+            assert math.isnan(batched), (amount, from_currency, to_currency, on_date)
+        else:
+            assert batched == pytest.approx(row_by_row), (amount, from_currency, to_currency, on_date)
+
+
+def test_target_currency_per_row():
+    converted = convert([10.0, 10.0, 10.0],
+                        ["USD", "EUR", "GEL"],
+                        ["EUR", "USD", ""],
+                        np.array(["2024-05-03"] * 3, dtype="datetime64[D]"),
+                        RateMatrix.from_tables(TABLES, CURRENCIES))
+
+    assert converted[0] == pytest.approx(expected(10.0, "USD", "EUR", date(2024, 5, 3)))
+    assert converted[1] == pytest.approx(expected(10.0, "EUR", "USD", date(2024, 5, 3)))
+    assert math.isnan(converted[2])
@@ -0,0 +1,198 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import date
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import text
+
+from database.database import DatabaseFacade
+from handlers.abstract_router_builder import AbstractRouterBuilder
+from resources import interface_messages
+
+RATES = {"base": "USD", "rates": {"USD": 1.0, "EUR": 0.9}}
+
+
+class FakeLogger:
+    def __init__(self):
+        self.messages = []
+
+    def log(self, action, user: str = '', extra_text: str = '', level: str = "info"):
+        self.messages.append(extra_text)
+
+
+class FakeSession:
+    """Session of a stored rates table, commit fails if asked to."""
+
+    def __init__(self, fail_on_commit: bool = False):
+        self.fail_on_commit = fail_on_commit
+        self.commits = 0
+
+    async def scalar(self, statement):
+        return uuid4()
+
+    def add(self, instance):
+        pass
+
+    async def commit(self):
+        if self.fail_on_commit:
+            raise RuntimeError("connection lost")
+        self.commits += 1
+
+    async def rollback(self):
+        pass
+
+
+class FakeDatabaseFacade:
+    def __init__(self, session: FakeSession):
+        self.session = session
+        self.count_statements = DatabaseFacade.count_statements
+
+    @asynccontextmanager
+    async def get_async_session(self):
+        yield self.session
+
+
+class FakeMessage:
+    """Reply to the user's message, texts it showed are recorded in order."""
+
+    def __init__(self):
+        self.message_id = 42
+        self.reply_markup = None
+        self.texts = []
+
+    async def reply(self, text: str, **kwargs):
+        self.texts.append(text)
+        self.reply_markup = kwargs.get("reply_markup")
+        return self
+
+    async def edit_text(self, text: str, **kwargs):
+        self.texts.append(text)
+        self.reply_markup = kwargs.get("reply_markup")
+
+
+def build_router(session: FakeSession | None = None, category_id=None) -> AbstractRouterBuilder:
+    router = AbstractRouterBuilder(FakeLogger())
+    if session is not None:
+        router.db = FakeDatabaseFacade(session)
+
+    async def get_category_id(category: str):
+        return category_id or uuid4()
+
+    async def get_base_currency(user_id: int):
+        return "USD"
+
+    async def extract_pivot_rates(on_date: str):
+        return RATES
+
+    router.reference_data = SimpleNamespace(get_category_id=get_category_id)
+    router.get_base_currency = get_base_currency
+    router.currency_rate_extractor.extract_pivot_rates = extract_pivot_rates
+    return router
+
+
+def build_payload(user_id: int = 1, spent_on: date = date(2024, 5, 1)) -> dict:
+    return {
+        "expense_id": uuid4(),
+        "user_id": user_id,
+        "message_id": 42,
+        "spent_on": spent_on,
+        "amount": 10.0,
+        "currency": "EUR",
+        "base_currency": "USD",
+        "amount_in_base_currency": 11.11,
+        "needs_rerating": False,
+        "comment": "",
+    }
+
+
+USER_ID = 990000003
+RATE_DATE = date(1990, 2, 1)
+
+
+@pytest.mark.parametrize("rates_stored, expected_statements", [
+    (True, {"statements": 2, "writes": 1}),
+    (False, {"statements": 3, "writes": 2}),
+])
+def test_save_round_trips_are_counted_by_engine_hook(database: DatabaseFacade, rates_stored: bool,
+                                                     expected_statements: dict):
+    """Select of the rates table, its insert if it is not stored yet and insert of the expense, nothing else."""
+    async def delete_test_data(db):
+        await db.execute(text("DELETE FROM expense_bot.expenses WHERE user_id = :user_id"), {"user_id": USER_ID})
+        await db.execute(text(
+            "DELETE FROM expense_bot.currency_rates WHERE rate_date = :rate_date AND base = 'USD'"
+        ), {"rate_date": RATE_DATE})
+        await db.execute(text("DELETE FROM expense_bot.users WHERE id = :user_id"), {"user_id": USER_ID})
+        await db.commit()
+
+    async def main():
+        try:
+            async with database.get_async_session_maker()() as db:
+                await delete_test_data(db)
+                await db.execute(text("""
+                    INSERT INTO expense_bot.users (id, role, created_at, updated_at)
+                    VALUES (:user_id, 'viewer', now(), now())
+                """), {"user_id": USER_ID})
+                if rates_stored:
+                    await db.execute(text("""
+                        INSERT INTO expense_bot.currency_rates (id, rate_date, base, rates, created_at, updated_at)
+                        VALUES (gen_random_uuid(), :rate_date, 'USD', CAST(:rates AS jsonb), now(), now())
+                    """), {"rate_date": RATE_DATE, "rates": json.dumps(RATES["rates"])})
+                category_id = (await db.execute(text(
+                    "SELECT id FROM expense_bot.categories WHERE name = 'Food'"
+                ))).scalar_one()
+                await db.commit()
+
+            router = build_router(category_id=category_id)
+            error = await router._AbstractRouterBuilder__add_expense_to_db(
+                build_payload(USER_ID, RATE_DATE), "Food", RATES
+            )
+
+            async with database.get_async_session_maker()() as db:
+                saved = (await db.execute(text(
+                    "SELECT count(*) FROM expense_bot.expenses WHERE user_id = :user_id"
+                ), {"user_id": USER_ID})).scalar_one()
+                await delete_test_data(db)
+        finally:
+            await database.get_async_engine().dispose()
+        return error, saved, router.logger.messages
+
+    error, saved, log_messages = asyncio.run(main())
+
+    assert error is None
+    assert saved == 1
+    assert log_messages[-1].endswith(str(expected_statements))
+
+
+def test_expense_is_reported_recorded_after_commit():
+    session = FakeSession()
+    router = build_router(session)
+    message = FakeMessage()
+
+    asyncio.run(router.report_expense_details({
+        "message": message, "user_id": 1, "spent_on": "2024-05-01",
+        "category": "Food", "amount": "10 EUR", "comment": ""
+    }))
+
+    assert session.commits == 1
+    assert [t.split("\n")[0] for t in message.texts] == [
+        interface_messages.SAVING_RECORD.split("\n")[0], interface_messages.SUCCESS_RECORD.split("\n")[0]
+    ]
+    assert message.reply_markup is not None
+
+
+def test_expense_is_reported_not_recorded_when_save_fails():
+    session = FakeSession(fail_on_commit=True)
+    router = build_router(session)
+    message = FakeMessage()
+
+    asyncio.run(router.report_expense_details({
+        "message": message, "user_id": 1, "spent_on": "2024-05-01",
+        "category": "Food", "amount": "10 EUR", "comment": ""
+    }))
+
+    assert not any(t.startswith(interface_messages.SUCCESS_RECORD) for t in message.texts)
+    assert message.texts[-1].startswith(interface_messages.FAILED_RECORD)
+    assert message.reply_markup is None
@@ -0,0 +1,154 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram import Bot, Dispatcher, F
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import Update
+from sqlalchemy.dialects import postgresql
+
+from database.fsm_storage import FsmDataCodec, PostgresStorage, flush_fsm_batch
+from middlewares import FsmBatchMiddleware
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+
+
+class FakeFsmDatabase:
+    """`fsm_states` table kept in a dict, statements issued by the storage are recorded."""
+
+    def __init__(self):
+        self.rows: dict[str, SimpleNamespace] = {}
+        self.statements = []
+
+    def get_async_session_maker(self):
+        return lambda: FakeFsmSession(self)
+
+    def count(self, kind: str) -> int:
+        return sum(getattr(statement, f"is_{kind}") for statement in self.statements)
+
+
+class FakeFsmSession:
+    def __init__(self, db: FakeFsmDatabase):
+        self.db = db
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def execute(self, statement):
+        self.db.statements.append(statement)
+        params = statement.compile(dialect=postgresql.dialect()).params
+        if statement.is_select:
+            row = self.db.rows.get(params["key_1"])
+            return SimpleNamespace(first=lambda: row)
+        if statement.is_insert:
+            self.db.rows[params["key"]] = SimpleNamespace(state=params["state"], data=params["data"])
+        elif statement.is_delete:
+            self.db.rows.pop(params["key_1"], None)
+
+    async def commit(self):
+        pass
+
+
+@pytest.fixture
+def db() -> FakeFsmDatabase:
+    return FakeFsmDatabase()
+
+
+@pytest.fixture
+def storage(db: FakeFsmDatabase) -> PostgresStorage:
+    return PostgresStorage(db, FsmDataCodec(bot=None, enums=[]))
+
+
+def test_changes_are_kept_when_handler_fails(storage: PostgresStorage):
+    async def handle_update():
+        async with storage.batch():
+            await storage.set_state(KEY, "expense:amount")
+            await storage.set_data(KEY, {"category": "Food"})
+            raise RuntimeError("handler failed")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(handle_update())
+
+    assert asyncio.run(storage.get_state(KEY)) == "expense:amount"
+    assert asyncio.run(storage.get_data(KEY)) == {"category": "Food"}
+
+
+def test_changes_are_written_when_batch_exits(db: FakeFsmDatabase, storage: PostgresStorage):
+    async def main():
+        async with storage.batch():
+            await storage.set_state(KEY, "expense:amount")
+            await storage.set_data(KEY, {"category": "Food"})
+            assert db.count("insert") == 0
+
+    asyncio.run(main())
+    assert db.count("insert") == 1
+
+
+def test_concurrent_update_reads_state_of_sleeping_handler(storage: PostgresStorage):
+    async def sleeping_update(state_set: asyncio.Event, state_read: asyncio.Event):
+        async with storage.batch():
+            await storage.set_state(KEY, "expense:shortcut")
+            await flush_fsm_batch()
+            state_set.set()
+            await state_read.wait()
+
+    async def next_update(state_set: asyncio.Event, state_read: asyncio.Event) -> str:
+        await state_set.wait()
+        async with storage.batch():
+            state = await storage.get_state(KEY)
+        state_read.set()
+        return state
+
+    async def main():
+        state_set, state_read = asyncio.Event(), asyncio.Event()
+        _, state = await asyncio.gather(sleeping_update(state_set, state_read), next_update(state_set, state_read))
+        return state
+
+    assert asyncio.run(main()) == "expense:shortcut"
+
+
+def test_cleared_flow_is_deleted(db: FakeFsmDatabase, storage: PostgresStorage):
+    async def main():
+        await storage.set_state(KEY, "expense:amount")
+        await storage.set_state(KEY, None)
+
+    asyncio.run(main())
+    assert db.rows == {}
+
+
+def test_state_is_read_once_per_update(db: FakeFsmDatabase, storage: PostgresStorage):
+    dispatcher = Dispatcher(storage=storage)
+    FsmBatchMiddleware.setup(dispatcher, storage)
+
+    @dispatcher.message(F.text)
+    async def handler(message, state: FSMContext):
+        await state.get_state()
+        await state.update_data(amount=message.text)
+        await state.update_data(currency="EUR")
+
+    update = Update.model_validate({
+        "update_id": 1,
+        "message": {
+            "message_id": 1,
+            "date": 0,
+            "text": "10",
+            "chat": {"id": 10, "type": "private"},
+            "from": {"id": 10, "is_bot": False, "first_name": "User"},
+        },
+    })
+
+    async def main():
+        bot = Bot("1:token")
+        try:
+            await dispatcher.feed_update(bot, update)
+        finally:
+            await bot.session.close()
+
+    asyncio.run(main())
+    assert db.count("select") == 1
+    assert db.count("insert") == 1
+    assert asyncio.run(storage.get_data(KEY)) == {"amount": "10", "currency": "EUR"}
@@ -0,0 +1,131 @@
+import asyncio
+import json
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import text
+
+from database.database import DatabaseFacade
+from resources import scheduler_job_templates
+from resources.currency_rate_extractor import CurrencyRateExtractor
+
+USER_ID = 990000002
+RATES = {"USD": 1.0, "EUR": 0.8, "GEL": 2.5}
+
+
+class FakeLogger:
+    def __init__(self):
+        self.messages = []
+
+    def log(self, action, user: str = '', extra_text: str = '', level: str = "info"):
+        self.messages.append(extra_text)
+
+
+async def add_zero_rated_expenses(db, rate_date: str, expenses: list[tuple[float, str, str | None]]):
+    rate_id = (await db.execute(text("""
+        INSERT INTO expense_bot.currency_rates (id, rate_date, base, rates, created_at, updated_at)
+        VALUES (gen_random_uuid(), :rate_date, 'USD', CAST(:rates AS jsonb), now(), now())
+        RETURNING id
+    """), {"rate_date": date.fromisoformat(rate_date), "rates": json.dumps({c: 0 for c in RATES})})).scalar_one()
+    for amount, currency, base_currency in expenses:
+        await db.execute(text("""
+            INSERT INTO expense_bot.expenses (id, user_id, message_id, category_id, spent_on, amount, currency,
+                                              currency_rate_id, base_currency, amount_in_base_currency,
+                                              needs_rerating, created_at)
+            SELECT gen_random_uuid(), :user_id, 1, c.id, :rate_date, :amount, :currency,
+                   :currency_rate_id, :base_currency, NULL, true, now()
+            FROM expense_bot.categories c WHERE c.name = 'Food'
+        """), {"user_id": USER_ID, "rate_date": date.fromisoformat(rate_date), "amount": amount,
+               "currency": currency, "currency_rate_id": rate_id, "base_currency": base_currency})
+
+
+async def delete_test_data(db):
+    rate_ids = (await db.execute(text(
+        "SELECT DISTINCT currency_rate_id FROM expense_bot.expenses WHERE user_id = :user_id"
+    ), {"user_id": USER_ID})).scalars().all()
+    await db.execute(text("DELETE FROM expense_bot.expenses WHERE user_id = :user_id"), {"user_id": USER_ID})
+    await db.execute(text("DELETE FROM expense_bot.currency_rates WHERE id = ANY(:ids)"), {"ids": list(rate_ids)})
+    await db.execute(text("DELETE FROM expense_bot.users WHERE id = :user_id"), {"user_id": USER_ID})
+    await db.commit()
+
+
+@pytest.fixture
+def rate_provider(monkeypatch) -> SimpleNamespace:
+    """Rates providers are back except for `unavailable` dates, dates asked for are recorded in `asked`."""
+    provider = SimpleNamespace(asked=[], unavailable=set())
+
+    async def extract_currency_rates(self, base_currency: str = "USD", on_date: str | None = None):
+        provider.asked.append(on_date)
+        if on_date in provider.unavailable:
+            return {"base": base_currency, "rates": {c: 0 for c in RATES}}
+        return {"base": base_currency, "rates": dict(RATES)}
+
+    monkeypatch.setattr(CurrencyRateExtractor, "extract_currency_rates", extract_currency_rates)
+    return provider
+
+
+def run_repair_job(database: DatabaseFacade,
+                   expenses_by_date: dict[str, list],
+                   runs: int = 1,
+                   **job_kwargs) -> dict:
+    async def main():
+        try:
+            async with database.get_async_session_maker()() as db:
+                await delete_test_data(db)
+                await db.execute(text("""
+                    INSERT INTO expense_bot.users (id, role, created_at, updated_at)
+                    VALUES (:user_id, 'viewer', now(), now())
+                """), {"user_id": USER_ID})
+                for rate_date, expenses in expenses_by_date.items():
+                    await add_zero_rated_expenses(db, rate_date, expenses)
+                await db.commit()
+
+            for _ in range(runs):
+                await scheduler_job_templates.job_repair_zero_rated_expenses(FakeLogger(), **job_kwargs)
+
+            async with database.get_async_session_maker()() as db:
+                rows = (await db.execute(text("""
+                    SELECT spent_on::varchar, currency, base_currency, amount_in_base_currency, needs_rerating
+                    FROM expense_bot.expenses WHERE user_id = :user_id
+                """), {"user_id": USER_ID})).all()
+                await delete_test_data(db)
+        finally:
+            await database.get_async_engine().dispose()
+        return {(row.spent_on, row.currency, row.base_currency): row for row in rows}
+
+    return asyncio.run(main())
+
+
+def test_rerated_amounts_match_row_by_row_conversion(database: DatabaseFacade, rate_provider: SimpleNamespace):
+    expenses = [(10.0, "EUR", "USD"), (10.0, "GEL", "EUR"), (10.0, "USD", "USD"), (10.0, "XXX", "USD"),
+                (10.0, "EUR", None)]
+    rows = run_repair_job(database, {"1990-01-02": expenses})
+
+    for amount, currency, base_currency in expenses:
+        row = rows[("1990-01-02", currency, base_currency)]
+        assert not row.needs_rerating
+        expected = CurrencyRateExtractor.convert(amount, currency, base_currency, RATES)
+        assert row.amount_in_base_currency == (pytest.approx(expected) if expected is not None else None)
+
+
+def test_unavailable_dates_do_not_hold_up_the_queue(database: DatabaseFacade, rate_provider: SimpleNamespace):
+    rate_provider.unavailable = {"1990-01-01", "1990-01-02"}
+    expenses_by_date = {on_date: [(10.0, "EUR", "USD")] for on_date in ("1990-01-01", "1990-01-02", "1990-01-03")}
+
+    rows = run_repair_job(database, expenses_by_date, runs=4, max_batches=1)
+
+    # newest first, then the failed tables are backed off instead of being asked for again
+    assert rate_provider.asked == ["1990-01-03", "1990-01-02", "1990-01-01"]
+    assert not rows[("1990-01-03", "EUR", "USD")].needs_rerating
+    assert rows[("1990-01-02", "EUR", "USD")].needs_rerating
+    assert rows[("1990-01-01", "EUR", "USD")].needs_rerating
+
+
+def test_failed_tables_are_retried_after_backoff(database: DatabaseFacade, rate_provider: SimpleNamespace):
+    rate_provider.unavailable = {"1990-01-01"}
+
+    rows = run_repair_job(database, {"1990-01-01": [(10.0, "EUR", "USD")]}, runs=3, retry_after=0)
+
+    assert rate_provider.asked == ["1990-01-01"] * 3
+    assert rows[("1990-01-01", "EUR", "USD")].needs_rerating
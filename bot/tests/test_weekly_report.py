@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+from sqlalchemy import text
+
+from database.database import DatabaseFacade
+from resources.analytics_sql_templates import DEFAULT_WEEKLY_REPORT
+
+USER_ID = 990000001
+WEEK_START = "DATE_TRUNC('week', CURRENT_DATE)::date"
+
+
+async def add_rates(db, days_from_week_start: int, base: str, rates: dict) -> str:
+    return (await db.execute(text(f"""
+        INSERT INTO expense_bot.currency_rates (id, rate_date, base, rates, created_at, updated_at)
+        VALUES (gen_random_uuid(), {WEEK_START} + {days_from_week_start}, :base, CAST(:rates AS jsonb), now(), now())
+        RETURNING id
+    """), {"base": base, "rates": json.dumps(rates)})).scalar_one()
+
+
+async def add_expense(db, currency_rate_id: str, amount: float, currency: str):
+    await db.execute(text(f"""
+        INSERT INTO expense_bot.expenses (id, user_id, message_id, category_id, spent_on, amount, currency,
+                                          currency_rate_id, base_currency, amount_in_base_currency,
+                                          needs_rerating, created_at)
+        SELECT gen_random_uuid(), :user_id, 1, c.id, {WEEK_START}, :amount, :currency,
+               :currency_rate_id, :currency, :amount, false, now()
+        FROM expense_bot.categories c WHERE c.name = 'Food'
+    """), {"user_id": USER_ID, "amount": amount, "currency": currency, "currency_rate_id": currency_rate_id})
+
+
+def test_week_kept_in_several_base_currencies_is_converted(database: DatabaseFacade):
+    """
+    The user switched base currency from USD to EUR within the week, so the week has totals in both.
+    The newest pivot table has no EUR rate and a newer table of another base is stored too,
+    USD total has to be converted with the newest pivot table having both currencies.
+    """
+    async def main():
+        try:
+            async with database.get_async_session_maker()() as db:
+                await db.execute(text("""
+                    INSERT INTO expense_bot.users (id, role, created_at, updated_at)
+                    VALUES (:user_id, 'viewer', now(), now())
+                """), {"user_id": USER_ID})
+                await db.execute(text("""
+                    INSERT INTO expense_bot.users_properties (property_id, user_id, property_value, created_at, updated_at)
+                    SELECT id, :user_id, '{"base_currency": "EUR"}', now(), now()
+                    FROM expense_bot.properties WHERE name = 'base_currency'
+                """), {"user_id": USER_ID})
+                rate_id = await add_rates(db, 5, "USD", {"USD": 1.0, "EUR": 0.5})
+                await add_rates(db, 6, "USD", {"USD": 1.0, "GEL": 2.7})
+                await add_rates(db, 6, "EUR", {"EUR": 1.0, "USD": 4.0})
+                await add_expense(db, rate_id, 20.0, "USD")
+                await add_expense(db, rate_id, 10.0, "EUR")
+
+                report = (await db.execute(text(
+                    DEFAULT_WEEKLY_REPORT.replace("{{user_id}}", str(USER_ID))
+                                         .replace("{{pivot_currency}}", "USD")
+                ))).mappings().all()
+                await db.rollback()
+        finally:
+            await database.get_async_engine().dispose()
+        return {row["category_name"]: row["sum_amount"] for row in report}
+
+    assert asyncio.run(main()) == {"Food": "20.00 EUR", "TOTAL": "20.00 EUR"}
@@ -0,0 +1,119 @@
+import asyncio
+import hmac
+import json
+import os
+
+from aiogram import types
+from aiohttp import web
+from pydantic import ValidationError
+
+from bot import BotRunner
+from database.database import DatabaseFacade
+from resources.currency_rate_cache import CurrencyRateCache
+from resources.currency_rate_extractor import CurrencyRateExtractor
+
+
+class WebhookServer:
+    """
+    Receives updates over webhook and handles them concurrently, at most `max_concurrent_updates` at a time.
+    Updates are acknowledged right away and handled in background, so slow handlers do not block Telegram.
+    Also exposes `/health` and `/metrics` (JSON) routes, metrics only with `METRICS_TOKEN` as bearer token.
+    Recorded updates can be posted to the webhook path locally, without `WEBHOOK_URL` the webhook is not set.
+    Arguments which are not passed are read from environment when the server is created.
+    """
+
+    def __init__(self,
+                 runner: BotRunner,
+                 path: str | None = None,
+                 secret_token: str | None = None,
+                 max_concurrent_updates: int | None = None,
+                 metrics_token: str | None = None):
+        self.runner = runner
+        self.path = path or os.getenv("WEBHOOK_PATH", "/webhook")
+        self.secret_token = secret_token or os.getenv("WEBHOOK_SECRET")
+        self.max_concurrent_updates = max_concurrent_updates or int(os.getenv("WEBHOOK_MAX_CONCURRENT_UPDATES", 16))
+        self.metrics_token = metrics_token or os.getenv("METRICS_TOKEN")
+        self._semaphore = asyncio.Semaphore(self.max_concurrent_updates)
+        self._tasks: set[asyncio.Task] = set()
+        self.stats = {"received": 0, "handled": 0, "failed": 0, "rejected": 0}
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get("/health", self.handle_health)
+        app.router.add_get("/metrics", self.handle_metrics)
+        app.on_shutdown.append(self.__on_shutdown)
+        return app
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if self.secret_token and not self.__is_token_valid(
+                request.headers.get("X-Telegram-Bot-Api-Secret-Token"), self.secret_token):
+            self.stats["rejected"] += 1
+            return web.Response(status=401)
+        try:
+            update = types.Update.model_validate(await request.json(), context={"bot": self.runner.bot})
+        except (json.JSONDecodeError, UnicodeDecodeError, ValidationError) as e:
+            self.stats["rejected"] += 1
+            return web.Response(status=400, text=f"Malformed update: {e.__class__.__name__}")
+        self.stats["received"] += 1
+        task = asyncio.create_task(self.__feed_update(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "in_flight": len(self._tasks)})
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        # pool and provider internals are not public, without configured token metrics are disabled
+        if not self.metrics_token:
+            return web.Response(status=404)
+        if not self.__is_token_valid(request.headers.get("Authorization"), f"Bearer {self.metrics_token}"):
+            return web.Response(status=401)
+        return web.json_response({
+            "updates": {**self.stats, "in_flight": len(self._tasks), "limit": self.max_concurrent_updates},
+            "db_pool": DatabaseFacade.get_pool_stats(),
+            "currency_rate_cache": CurrencyRateCache.get_shared().get_stats(),
+            "currency_rate_providers": CurrencyRateExtractor.provider_stats.get_stats(),
+            "coalesced_rate_requests": CurrencyRateExtractor.coalesced_requests,
+        })
+
+    async def __feed_update(self, update: types.Update):
+        async with self._semaphore:
+            try:
+                await self.runner.dispatcher.feed_update(self.runner.bot, update)
+                self.stats["handled"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                self.runner.logger.log(self, "", f"Update {update.update_id} failed: {e}", "error")
+
+    @staticmethod
+    def __is_token_valid(received: str | None, expected: str) -> bool:
+        return received is not None and hmac.compare_digest(received.encode(), expected.encode())
+
+    async def __on_shutdown(self, app: web.Application):
+        if self._tasks:
+            await asyncio.wait(self._tasks)
+
+    async def run(self,
+                  host: str | None = None,
+                  port: int | None = None,
+                  webhook_url: str | None = None):
+        host = host or os.getenv("WEBHOOK_HOST", "0.0.0.0")
+        port = port or int(os.getenv("WEBHOOK_PORT", 8080))
+        webhook_url = webhook_url or os.getenv("WEBHOOK_URL")
+        app_runner = web.AppRunner(self.build_app())
+        await app_runner.setup()
+        await web.TCPSite(app_runner, host, port).start()
+        if webhook_url:
+            await self.runner.bot.set_webhook(
+                url=webhook_url.rstrip("/") + self.path,
+                secret_token=self.secret_token,
+                max_connections=self.max_concurrent_updates,
+                allowed_updates=self.runner.dispatcher.resolve_used_update_types()
+            )
+        self.runner.logger.log(self, "admin", f"Webhook server listening on {host}:{port}{self.path}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await app_runner.cleanup()